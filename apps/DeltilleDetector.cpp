@@ -16,15 +16,24 @@
 * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
 */
 
+#include <condition_variable>
+#include <cstdint>
+#include <cstdio>
 #include <cstdlib>
+#include <deque>
 #include <fstream>
 #include <iostream>
 #include <limits>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <thread>
 #include <vector>
 
 #include <deltille/target_detector.h>
 
 #include <opencv2/highgui.hpp>
+#include <opencv2/videoio.hpp>
 
 #include <boost/filesystem.hpp>
 #include <boost/program_options.hpp>
@@ -72,6 +81,100 @@ bool writeCornersToFile(std::ostream &os,
   return os.good();
 }
 
+/**
+ * Corners of all frames in one file: orpc blocks back to back (ascii), or
+ * the binary container read by scripts/orpc_io.py (little-endian):
+ *
+ *   header  "ORPCBIN1", u32 version, u32 reserved, u64 index offset,
+ *           u64 number of frames
+ *   corners f64 x, f64 y, i32 board id, i32 point id of the ordered corners
+ *           of every frame, frame after frame
+ *   index   u64 first corner, u64 number of corners, i32 width, i32 height
+ *           of every frame
+ *   names   frame names (the orpc filename field), '\n' separated, until
+ *           the end of the file
+ */
+class ConsolidatedWriter {
+public:
+  ConsolidatedWriter(const string &filename, bool binary)
+      : _os(filename, binary ? ios::binary : ios::out), _binary(binary) {
+    if (_binary && _os.is_open()) {
+      const uint32_t version = 1, reserved = 0;
+      const uint64_t index_offset = 0, num_frames = 0;  // written on close
+      _os.write("ORPCBIN1", 8);
+      write_value(version);
+      write_value(reserved);
+      write_value(index_offset);
+      write_value(num_frames);
+    }
+  }
+
+  ~ConsolidatedWriter() {
+    if (!_binary || !_os.is_open()) {
+      return;
+    }
+    const uint64_t index_offset = uint64_t(_os.tellp()), num_frames = _frames.size();
+    for (const auto &f : _frames) {
+      write_value(f.first);
+      write_value(f.count);
+      write_value(f.width);
+      write_value(f.height);
+    }
+    _os << _names;
+    _os.seekp(16);
+    write_value(index_offset);
+    write_value(num_frames);
+  }
+
+  bool is_open() const { return _os.is_open(); }
+
+  void write(const string &filename, const vector<CalibrationCorner> &corners,
+             const cv::Size &image_size) {
+    if (!_binary) {
+      writeCornersToFile(_os, corners, filename, image_size, true);
+      return;
+    }
+
+    vector<Corner> records;
+    records.reserve(corners.size());
+    for (const auto &c : corners) {
+      if (c.isValid() && c.isOrdered) {
+        records.push_back({c.x, c.y, c.boardId, c.pointId});
+      }
+    }
+    cout << "Writing " << records.size() << " corners to : " << filename << endl;
+    _os.write(reinterpret_cast<const char *>(records.data()),
+              records.size() * sizeof(Corner));
+
+    _frames.push_back({_num_corners, records.size(), image_size.width,
+                       image_size.height});
+    _num_corners += records.size();
+    _names += (_frames.size() > 1 ? "\n" : "") + filename;
+  }
+
+private:
+  struct Corner {
+    double x, y;
+    int32_t board_id, point_id;
+  };
+  static_assert(sizeof(Corner) == 24, "corner records must be packed");
+
+  struct Frame {
+    uint64_t first, count;
+    int32_t width, height;
+  };
+
+  template <class T> void write_value(const T &value) {
+    _os.write(reinterpret_cast<const char *>(&value), sizeof(T));
+  }
+
+  std::ofstream _os;
+  bool _binary;
+  uint64_t _num_corners{0};
+  vector<Frame> _frames;
+  string _names;
+};
+
 /**
  */
 class DataSource {
@@ -141,8 +244,101 @@ private:
   vector<string> _filenames;
 };
 
+/**
+ * Frames of a video decoded with cv::VideoCapture. Every stride-th frame
+ * between start and end [s] (end < 0: until the last frame) is returned.
+ * Frame k of video.mp4 is named video_<k>.jpg (k with 6 digits) next to the
+ * video, so its outputs are written there (video_<k>.orpc, with the same
+ * filename field as the orpc file of an image).
+ */
+class VideoDataSource : public DataSource {
+public:
+  VideoDataSource(const string &filename, int stride = 1, double start = 0.0,
+                  double end = -1.0)
+      : _capture(filename), _stride(max(1, stride)), _end(end) {
+    if (!_capture.isOpened()) {
+      throw invalid_argument("cannot open video '" + filename + "'");
+    }
+    if (start > 0.0) {
+      _capture.set(cv::CAP_PROP_POS_MSEC, 1000.0 * start);
+    }
+    auto path = fs::path(filename);
+    _prefix = (path.parent_path() / path.stem()).string() + "_";
+  }
+
+private:
+  bool get_image(cv::Mat &I, int) override {
+    if (_started) {
+      // skip the frames in between
+      for (int k = 1; k < _stride; ++k) {
+        if (!_capture.grab()) {
+          return false;
+        }
+      }
+    }
+    _started = true;
+
+    auto frame_index = int(_capture.get(cv::CAP_PROP_POS_FRAMES));
+    if (!_capture.read(I) || I.empty()) {
+      return false;
+    }
+    if (_end >= 0.0 && _capture.get(cv::CAP_PROP_POS_MSEC) > 1000.0 * _end) {
+      return false;
+    }
+
+    char index[16];
+    snprintf(index, sizeof(index), "%06d", frame_index);
+    this->_last_file_name = _prefix + index + ".jpg";
+    return true;
+  }
+
+private:
+  cv::VideoCapture _capture;
+  int _stride;
+  double _end;
+  bool _started{false};
+  string _prefix;
+};
+
+/**
+ * Write the corners of an image next to it, or append them to consolidated
+ * if given, and its debug image to output_dir
+ */
+void WriteOutputs(const string &filename,
+                  const vector<CalibrationCorner> &corners,
+                  const cv::Size &image_size, const cv::Mat &output_image,
+                  const string output_dir, bool save_images,
+                  ConsolidatedWriter *consolidated = nullptr) {
+  auto filepath = fs::path(filename);
+  auto outpath =
+      output_dir.empty() ? filepath.parent_path() : fs::path(output_dir);
+  auto basename = filepath.stem();
+  auto out_orpc_fn = filepath.parent_path() / fs::change_extension(basename, ".orpc");
+
+  if (consolidated) {
+    consolidated->write(basename.string() + ".jpg", corners, image_size);
+  } else {
+    std::ofstream fo(out_orpc_fn.string());
+    if (fo.is_open()) {
+      string filename = basename.string() + ".jpg";
+      writeCornersToFile(fo, corners, filename, image_size, true);
+    } else {
+      cerr << "Failed to open: " << out_orpc_fn << " for writing"
+            << endl;
+    }
+  }
+
+  if (save_images) {
+    auto out_basename = basename.string();
+    auto out_img_fn = fs::change_extension(outpath / out_basename, ".png");
+    cout << "Writing detection image to : " << out_img_fn << endl;
+    cv::imwrite(out_img_fn.string(), output_image);
+  }
+}
+
 void RunDetector(DataSource *data_source, string target_dsc_fn,
-                 const string output_dir, bool save_images) {
+                 const string output_dir, bool save_images,
+                 ConsolidatedWriter *consolidated = nullptr) {
   TargetDetector target_detector(target_dsc_fn);
   
   cv::Mat I, output_image;
@@ -150,36 +346,148 @@ void RunDetector(DataSource *data_source, string target_dsc_fn,
     if (!I.empty()) {
       vector<CalibrationCorner> corners;
       target_detector.run(I, corners, save_images ? &output_image : nullptr);
+      WriteOutputs(data_source->getLastFilename(), corners, I.size(),
+                   output_image, output_dir, save_images, consolidated);
+    }
+  }
+}
 
-      auto filename = data_source->getLastFilename();
-      auto filepath = fs::path(filename);
-      auto outpath =
-          output_dir.empty() ? filepath.parent_path() : fs::path(output_dir);
-      auto basename = filepath.stem();
-      auto out_orpc_fn = filepath.parent_path() / fs::change_extension(basename, ".orpc");
-
-      std::ofstream fo(out_orpc_fn.string());
-      if (fo.is_open()) {
-        string filename = basename.string() + ".jpg";
-        writeCornersToFile(fo, corners, filename, I.size(), true);
-      } else {
-        cerr << "Failed to open: " << out_orpc_fn << " for writing"
-              << endl;
-      }
+/**
+ * Blocking FIFO of at most capacity items; pop fails once it is closed and
+ * empty
+ */
+template <class T> class BoundedQueue {
+public:
+  explicit BoundedQueue(size_t capacity) : _capacity(capacity) {}
+
+  void push(T &&item) {
+    unique_lock<mutex> lock(_mutex);
+    _not_full.wait(lock, [this] { return _items.size() < _capacity; });
+    _items.push_back(move(item));
+    _not_empty.notify_one();
+  }
+
+  bool pop(T &item) {
+    unique_lock<mutex> lock(_mutex);
+    _not_empty.wait(lock, [this] { return !_items.empty() || _closed; });
+    if (_items.empty()) {
+      return false;
+    }
+    item = move(_items.front());
+    _items.pop_front();
+    _not_full.notify_one();
+    return true;
+  }
+
+  void close() {
+    lock_guard<mutex> lock(_mutex);
+    _closed = true;
+    _not_empty.notify_all();
+  }
+
+private:
+  size_t _capacity;
+  bool _closed{false};
+  deque<T> _items;
+  mutex _mutex;
+  condition_variable _not_full, _not_empty;
+};
+
+/**
+ * An image on its way through the pipeline, seq is its position in the output
+ */
+struct PipelineFrame {
+  int seq{-1};
+  string filename;
+  cv::Mat image;
+  vector<CalibrationCorner> corners;
+  cv::Mat output_image;
+};
+
+/**
+ * Same as RunDetector, with images decoded on one thread, detected on
+ * num_threads threads (each with its own TargetDetector) and written on the
+ * calling thread in the input order, so the output does not change. At most
+ * 4 * num_threads images are in flight.
+ */
+void RunDetectorThreaded(DataSource *data_source, string target_dsc_fn,
+                         const string output_dir, bool save_images,
+                         int num_threads,
+                         ConsolidatedWriter *consolidated = nullptr) {
+  vector<unique_ptr<TargetDetector>> detectors;
+  for (int t = 0; t < num_threads; ++t) {
+    detectors.emplace_back(new TargetDetector(target_dsc_fn));
+  }
+
+  const size_t window = 4 * num_threads;
+  BoundedQueue<PipelineFrame> decoded(2 * num_threads), detected(window);
+  // a slot is taken by every decoded image and given back once written
+  BoundedQueue<int> slots(window);
+  for (size_t k = 0; k < window; ++k) {
+    slots.push(0);
+  }
 
-      if (save_images) {
-        auto out_basename = basename.string();
-        auto out_img_fn = fs::change_extension(outpath / out_basename, ".png");
-        cout << "Writing detection image to : " << out_img_fn << endl;
-        cv::imwrite(out_img_fn.string(), output_image);
+  thread reader([&] {
+    cv::Mat I;
+    int seq = 0, slot;
+    for (int i = 0; data_source->getImage(I, i); ++i) {
+      if (!I.empty()) {
+        slots.pop(slot);
+        PipelineFrame frame;
+        frame.seq = seq++;
+        frame.filename = data_source->getLastFilename();
+        frame.image = I;
+        decoded.push(move(frame));
+      }
+      I.release();
+    }
+    decoded.close();
+  });
+
+  vector<thread> workers;
+  for (int t = 0; t < num_threads; ++t) {
+    workers.emplace_back([&, t] {
+      PipelineFrame frame;
+      while (decoded.pop(frame)) {
+        detectors[t]->run(frame.image, frame.corners,
+                          save_images ? &frame.output_image : nullptr);
+        detected.push(move(frame));
       }
+    });
+  }
+  thread closer([&] {
+    for (auto &w : workers) {
+      w.join();
+    }
+    detected.close();
+  });
+
+  map<int, PipelineFrame> pending;
+  int next = 0;
+  PipelineFrame frame;
+  while (detected.pop(frame)) {
+    pending[frame.seq] = move(frame);
+    for (auto it = pending.find(next); it != pending.end();
+         it = pending.find(++next)) {
+      WriteOutputs(it->second.filename, it->second.corners,
+                   it->second.image.size(), it->second.output_image,
+                   output_dir, save_images, consolidated);
+      pending.erase(it);
+      slots.push(0);
     }
   }
+
+  reader.join();
+  closer.join();
 }
 
 int main(int argc, char **argv) {
   string target_dsc_fn;
   string output_dir{""};
+  int num_threads = 1;
+  string video_fn, consolidated_fn;
+  int stride = 1;
+  double start = 0.0, end = -1.0;
 
   vector<string> files;
 
@@ -190,7 +498,20 @@ int main(int argc, char **argv) {
                            po::value<vector<string>>(&files)->multitoken(),
                            "List of image files")(
       "output,o", po::value<string>(&output_dir), "Output directory")(
-      "save-images,s", "Store debug images");
+      "save-images,s", "Store debug images")(
+      "threads,j", po::value<int>(&num_threads)->default_value(1),
+      "Number of detection threads (0: all cores)")(
+      "video,v", po::value<string>(&video_fn),
+      "Video file, read instead of the image files")(
+      "stride", po::value<int>(&stride)->default_value(1),
+      "Detect every stride-th video frame")(
+      "start", po::value<double>(&start)->default_value(0.0),
+      "First video time to detect [s]")(
+      "end", po::value<double>(&end)->default_value(-1.0),
+      "Last video time to detect [s] (negative: until the end)")(
+      "consolidated,c", po::value<string>(&consolidated_fn),
+      "Write the corners of all frames to this file instead of one file per "
+      "frame; binary if it ends with .orpcb");
 
   po::variables_map vm;
   try {
@@ -223,9 +544,42 @@ int main(int argc, char **argv) {
     }
   }
 
-  if (!files.empty()) {
-    ImageListDataSource data_source(move(files));
-    RunDetector(&data_source, target_dsc_fn, output_dir, vm.count("save-images"));
+  if (vm.count("video") && vm.count("files")) {
+    throw invalid_argument("--video and --files cannot be used together");
+  }
+  for (const auto &option : {"stride", "start", "end"}) {
+    if (!vm.count("video") && !vm[option].defaulted()) {
+      throw invalid_argument(string("--") + option + " requires --video");
+    }
+  }
+
+  unique_ptr<DataSource> data_source;
+  if (!video_fn.empty()) {
+    data_source.reset(new VideoDataSource(video_fn, stride, start, end));
+  } else if (!files.empty()) {
+    data_source.reset(new ImageListDataSource(move(files)));
+  }
+
+  unique_ptr<ConsolidatedWriter> consolidated;
+  if (!consolidated_fn.empty()) {
+    auto binary = fs::path(consolidated_fn).extension() == ".orpcb";
+    consolidated.reset(new ConsolidatedWriter(consolidated_fn, binary));
+    if (!consolidated->is_open()) {
+      throw invalid_argument("cannot open '" + consolidated_fn + "' for writing");
+    }
+  }
+
+  if (data_source) {
+    if (num_threads <= 0) {
+      num_threads = max(1u, thread::hardware_concurrency());
+    }
+    if (num_threads == 1) {
+      RunDetector(data_source.get(), target_dsc_fn, output_dir,
+                  vm.count("save-images"), consolidated.get());
+    } else {
+      RunDetectorThreaded(data_source.get(), target_dsc_fn, output_dir,
+                          vm.count("save-images"), num_threads, consolidated.get());
+    }
   }
 
   return 0;
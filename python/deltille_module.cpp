@@ -0,0 +1,140 @@
+/**
+* Copyright (C) 2017-present, Facebook, Inc.
+*
+* This library is free software; you can redistribute it and/or
+* modify it under the terms of the GNU Lesser General Public
+* License as published by the Free Software Foundation; either
+* version 2.1 of the License, or (at your option) any later version.
+*
+* This library is distributed in the hope that it will be useful,
+* but WITHOUT ANY WARRANTY; without even the implied warranty of
+* MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+* Lesser General Public License for more details.
+*
+* You should have received a copy of the GNU Lesser General Public
+* License along with this library; if not, write to the Free Software
+* Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+*/
+
+//
+// Python bindings of TargetDetector: a detector keeps its board definitions
+// between frames, and frames are NumPy arrays used in place
+//
+
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+
+#include <opencv2/core.hpp>
+
+#include <deltille/target_detector.h>
+
+namespace py = pybind11;
+
+/**
+ * A corner as returned to Python, same fields as the lines of an orpc file
+ */
+struct CornerRecord {
+  int32_t board_id;
+  int32_t point_id;
+  int32_t is_ordered;
+  double x;
+  double y;
+};
+
+/**
+ * TargetDetector::run is not reentrant (the indexer keeps per-frame state),
+ * so calls on one detector are serialized; use a detector per thread to run
+ * frames concurrently
+ */
+class PyTargetDetector {
+public:
+  explicit PyTargetDetector(const std::string &target_dsc_fn)
+      : _detector(new TargetDetector(target_dsc_fn)) {}
+
+  py::array_t<CornerRecord> run(py::array image, bool ordered_only) {
+    cv::Mat I = wrap(image);
+
+    std::vector<CalibrationCorner> corners;
+    {
+      py::gil_scoped_release release;
+      std::lock_guard<std::mutex> lock(_mutex);
+      if (I.depth() == CV_16U) {
+        // same conversion as DataSource::convert_type of the executable
+        double max_val = 0.0;
+        cv::minMaxLoc(I, nullptr, &max_val);
+        I.convertTo(I, CV_32F, 255.0 * (1.0 / max_val));
+      }
+      _detector->run(I, corners);
+    }
+
+    std::vector<CornerRecord> records;
+    records.reserve(corners.size());
+    for (const auto &c : corners) {
+      if (!c.isValid() || (ordered_only && !c.isOrdered)) {
+        continue;
+      }
+      records.push_back({c.boardId, c.pointId, c.isOrdered, c.x, c.y});
+    }
+
+    py::array_t<CornerRecord> result(records.size());
+    std::copy(records.begin(), records.end(), result.mutable_data());
+    return result;
+  }
+
+private:
+  /**
+   * A cv::Mat header over the array data, no copy. Rows may be strided, but
+   * the pixels of a row must be contiguous.
+   */
+  static cv::Mat wrap(const py::array &image) {
+    if (image.ndim() != 2) {
+      throw py::value_error("expected a 2-D (grayscale) image");
+    }
+
+    int type;
+    if (py::isinstance<py::array_t<uint8_t>>(image)) {
+      type = CV_8UC1;
+    } else if (py::isinstance<py::array_t<uint16_t>>(image)) {
+      type = CV_16UC1;
+    } else if (py::isinstance<py::array_t<float>>(image)) {
+      type = CV_32FC1;
+    } else {
+      throw py::type_error("expected a uint8, uint16 or float32 image");
+    }
+
+    if (image.strides(1) != image.itemsize() || image.strides(0) < 0) {
+      throw py::value_error(
+          "the pixels of each row must be contiguous, use numpy.ascontiguousarray");
+    }
+
+    return cv::Mat(int(image.shape(0)), int(image.shape(1)), type,
+                   const_cast<void *>(image.data()), size_t(image.strides(0)));
+  }
+
+  std::unique_ptr<TargetDetector> _detector;
+  std::mutex _mutex;
+};
+
+PYBIND11_MODULE(deltille, m) {
+  m.doc() = "Deltille and checkerboard target detection";
+
+  PYBIND11_NUMPY_DTYPE(CornerRecord, board_id, point_id, is_ordered, x, y);
+
+  py::class_<PyTargetDetector>(m, "TargetDetector")
+      .def(py::init<const std::string &>(), py::arg("target_dsc_fn"),
+           "Load the board definitions of a target *.dsc file")
+      .def("run", &PyTargetDetector::run, py::arg("image"),
+           py::arg("ordered_only") = true,
+           "Detect the corners of a 2-D uint8, uint16 or float32 image.\n\n"
+           "uint8 and float32 images are used in place; uint16 images are\n"
+           "rescaled to [0, 255] like the deltille_detector executable does.\n"
+           "The GIL is released while detecting. Returns a structured array\n"
+           "with fields board_id, point_id, is_ordered, x, y of the valid\n"
+           "corners (only the ordered ones by default, as in .orpc files).");
+}
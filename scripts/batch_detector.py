@@ -0,0 +1,243 @@
+#!/usr/bin/python3
+
+import argparse
+import glob
+import math
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from detection_cache import DetectionCache, detector_build_id, file_digest
+from orpc_io import format_orpc, image_extensions, load_orpc_files
+
+
+def orpc_path(image: str) -> str:
+    # where RunDetector writes the corners of an image
+    return os.path.splitext(image)[0] + ".orpc"
+
+
+def is_up_to_date(image: str, target: str) -> bool:
+    """Whether the orpc file of an image is newer than the image and the target"""
+    orpc = orpc_path(image)
+    return os.path.exists(orpc) and \
+        os.path.getmtime(orpc) >= max(os.path.getmtime(image), os.path.getmtime(target))
+
+
+def written_since(image: str, started: float) -> bool:
+    """Whether the orpc file of an image was written at or after started
+    (file times lag the clock slightly, so a second of slack is allowed)"""
+    orpc = orpc_path(image)
+    return os.path.exists(orpc) and os.path.getmtime(orpc) >= started - 1.0
+
+
+def make_shards(images, num_shards: int, max_images: int):
+    """Split images into consecutive shards of about the same total file size
+    (a proxy of the detection time), each with at most max_images images"""
+    if not images:
+        return []
+    # empty files still take a detector call
+    sizes = np.maximum([os.path.getsize(f) for f in images], 1).astype(np.float64)
+    num_shards = max(num_shards, math.ceil(len(images) / max_images))
+    num_shards = min(num_shards, len(images))
+
+    # cut the cumulative size into equal parts
+    ends = np.cumsum(sizes)
+    cuts = np.searchsorted(ends, ends[-1] * np.arange(1, num_shards) / num_shards, "right")
+    bounds = np.unique(np.concatenate([[0], cuts, [len(images)]]))
+
+    # split the shards of many small images into equal parts
+    bounds = np.unique(np.concatenate([
+        np.linspace(b, e, math.ceil((e - b) / max_images) + 1).round().astype(int)
+        for b, e in zip(bounds[:-1], bounds[1:])]))
+    return [images[b:e] for b, e in zip(bounds[:-1], bounds[1:])]
+
+
+def run_shard(detector: str, target: str, images, debug_dir: str = ""):
+    """Run one detector process over a shard
+
+    Returns:
+        exit code, and the merged stdout and stderr of the detector
+    """
+    command = [detector, "-t", target, "-f", *images]
+    if debug_dir:
+        command += ["-o", debug_dir, "-s"]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return result.returncode, result.stdout
+
+
+def collect_images(inputs):
+    """Image files of files, directories and glob patterns, in the given order
+    (directories and patterns sorted by name)"""
+    images = []
+    for path in inputs:
+        if os.path.isdir(path):
+            matches = sorted(glob.glob(os.path.join(path, "*")))
+        elif os.path.exists(path):
+            matches = [path]
+        else:
+            matches = sorted(glob.glob(path))
+        images.extend(f for f in matches if os.path.splitext(f)[1].lower() in image_extensions)
+    return images
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the detector over many images in parallel shards. Images "
+        "with an up-to-date orpc file are skipped, so an interrupted run resumes."
+    )
+    parser.add_argument("target", help="Target dsc file")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument(
+        "--detector",
+        default=os.path.join("build", "apps", "deltille_detector"),
+        help="Detector executable (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of detector processes; 0 uses all cores (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shards_per_job",
+        type=int,
+        default=4,
+        help="Shards per process, so that faster processes take more shards (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max_shard_images",
+        type=int,
+        default=1000,
+        help="Maximum number of images of a shard, bounding the command line (default: %(default)s)",
+    )
+    parser.add_argument("--force", action="store_true", help="Detect all images, even up-to-date ones")
+    parser.add_argument("--log", default="", help="Write the detector output to this file, in image order")
+    parser.add_argument("--debug_dir", default="", help="Store the debug images of the detector here")
+    parser.add_argument(
+        "--table",
+        default="",
+        help="Load all orpc files, in image order, into this npz table (see orpc_io.py)",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const="",
+        default=None,
+        help="Reuse the corners of images detected before with the same target and detector, "
+        "from this cache directory (default without a directory: see detection_cache.py)",
+    )
+    parser.add_argument(
+        "--cache_size",
+        type=float,
+        default=1024.0,
+        help="Maximum size of the cache [MB]; least recently used results are evicted (default: %(default)s)",
+    )
+    parsed = parser.parse_args()
+
+    if not os.path.isfile(parsed.detector):
+        print(f"[ERROR] Detector \'{parsed.detector}\' not found")
+        print("\tBuild it first (see How to compile), or set --detector.")
+        sys.exit(0)
+    if not os.path.isfile(parsed.target):
+        print(f"[ERROR] Target \'{parsed.target}\' not found")
+        sys.exit(0)
+
+    images = collect_images(parsed.inputs)
+    pending = [f for f in images if parsed.force or not is_up_to_date(f, parsed.target)]
+    jobs = parsed.jobs if parsed.jobs > 0 else os.cpu_count()
+
+    # Write the orpc files of cached images instead of detecting them again
+    cache, keys, cached = None, {}, 0
+    if parsed.cache is not None:
+        cache = DetectionCache(parsed.cache, int(parsed.cache_size * (1 << 20)))
+        target_digest, build_id = file_digest(parsed.target), detector_build_id(parsed.detector)
+        with ThreadPoolExecutor(jobs) as executor:
+            keys = dict(zip(pending, executor.map(
+                lambda image: DetectionCache.key(image, target_digest, build_id), pending)))
+        misses = []
+        for image in pending:
+            result = cache.get(keys[image])
+            if result is None:
+                misses.append(image)
+                continue
+            corners, (width, height) = result
+            stem = os.path.splitext(os.path.basename(image))[0]
+            with open(orpc_path(image), "w") as f:
+                f.write(format_orpc(stem + ".jpg", width, height, corners))
+        cached, pending = len(pending) - len(misses), misses
+
+    shards = make_shards(pending, jobs * parsed.shards_per_job, parsed.max_shard_images)
+    print(f"{len(images)} images, {len(images) - len(pending) - cached} up to date, {cached} cached, "
+          f"{len(pending)} to detect in {len(shards)} shards on {jobs} processes", flush=True)
+
+    # Logs are written in shard (and so image) order as soon as possible
+    log = open(parsed.log, "w") if parsed.log else None
+    failed, unreadable = [], []
+    started = time.time()  # orpc files written by this run are newer
+    start = time.perf_counter()
+    while shards:
+        outputs, next_shard, finished, done = {}, 0, 0, 0
+        num_images = sum(len(shard) for shard in shards)
+        failed_shards = set()
+        with ThreadPoolExecutor(jobs) as executor:
+            futures = {executor.submit(run_shard, parsed.detector, parsed.target, shard, parsed.debug_dir): k
+                       for k, shard in enumerate(shards)}
+            for future in as_completed(futures):
+                k = futures[future]
+                returncode, outputs[k] = future.result()
+                finished += 1
+                done += len(shards[k])
+                if returncode != 0:
+                    failed_shards.add(k)
+                    print(f"[ERROR] Shard {k} ({shards[k][0]} ...) exited with code {returncode}")
+                    print("\t" + "\n\t".join(outputs[k].rstrip().splitlines()[-5:]))
+                print(f"[{finished}/{len(shards)}] {done}/{num_images} images, "
+                      f"{time.perf_counter() - start:.1f}s", flush=True)
+                while next_shard in outputs:
+                    if log is not None:
+                        log.write(outputs[next_shard])
+                    del outputs[next_shard]
+                    next_shard += 1
+        failed += [shards[k] for k in sorted(failed_shards)]
+
+        # The detector writes an orpc file for every image it reads, but stops
+        # at an unreadable image and still exits with 0: skip the first image
+        # without output, and detect the rest of its shard again
+        retries = []
+        for k, shard in enumerate(shards):
+            missing = [image for image in shard if not written_since(image, started)]
+            if k in failed_shards or not missing:
+                continue
+            unreadable.append(missing[0])
+            print(f"[ERROR] No output for {missing[0]}; the detector could not read it")
+            if len(missing) > 1:
+                retries.append(missing[1:])
+        shards = retries
+        if shards:
+            print(f"Detecting the {sum(len(shard) for shard in shards)} images after them again", flush=True)
+    if log is not None:
+        log.close()
+
+    # Failed shards may have stopped early, and their remaining images may
+    # keep the orpc files of an older run
+    if cache is not None:
+        failed_images = {image for shard in failed for image in shard}
+        for image in pending:
+            if image not in failed_images and written_since(image, started):
+                cache.put_orpc(keys[image], orpc_path(image))
+
+    if parsed.table:
+        existing = [orpc_path(f) for f in images if os.path.exists(orpc_path(f))]
+        table = load_orpc_files(existing, jobs, cache=parsed.table)
+        print(f"{len(table)} frames, {table.offsets[-1]} corners in {parsed.table}")
+
+    if unreadable:
+        print(f"[ERROR] {len(unreadable)} images could not be read and have no orpc file")
+        print("\t" + "\n\t".join(unreadable[:10]) + ("\n\t..." if len(unreadable) > 10 else ""))
+    if failed:
+        print(f"[ERROR] {len(failed)} shards failed; run again to retry their images")
+    if unreadable or failed:
+        sys.exit(1)
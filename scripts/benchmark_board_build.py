@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+import argparse
+import time
+import numpy as np
+
+from board_design import BoardDesign, geometry_modes
+from checkerboard import AprilCheckerBoard
+from deltilleboard import DeltilleBoard
+from glyph_cache import glyph_cache
+
+
+def benchmark_grid(board_type: str, rows: int, cols: int) -> np.ndarray:
+    """Grid of the given size with a tag in every 4th (checkerboard) or
+    3rd (deltille) cell along both axes, similar to the example designs"""
+    i, j = np.meshgrid(range(rows), range(cols), indexing='ij')
+    if board_type == 'checkerboard':
+        grid = np.where((i + j) % 2 == 0, 1, 0)
+        grid[(i % 4 == 2) & (j % 4 == 2)] = 2
+    else:
+        grid = np.ones((rows, cols), dtype=int)
+        grid[(i % 3 == 1) & (j % 3 == 1)] = 2
+    return grid
+
+
+def build_time(board_type: str, rows: int, cols: int, geometry_mode: str,
+               repeat: int = 1) -> float:
+    """Best wall time [s] of building a board over `repeat` runs,
+    each starting with an empty glyph cache"""
+    if board_type == 'checkerboard':
+        board_design = BoardDesign('checkerboard', 'aprilTag36h11',
+                                   benchmark_grid(board_type, rows, cols), 20.0)
+        board_class = AprilCheckerBoard
+    else:
+        board_design = BoardDesign('deltille', 'delTag36h9',
+                                   benchmark_grid(board_type, rows, cols), 20.0)
+        board_class = DeltilleBoard
+
+    best = float('inf')
+    for _ in range(repeat):
+        glyph_cache.clear()
+        start = time.perf_counter()
+        board_class(0, board_design, geometry_mode=geometry_mode)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure how board construction time scales with grid size."
+    )
+    parser.add_argument(
+        "--board_type",
+        choices=["checkerboard", "deltille"],
+        nargs="+",
+        default=["checkerboard", "deltille"],
+        help="Board types to benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[8, 16, 32, 64],
+        help="Number of grid rows; columns are 4/3 of it (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--modes",
+        choices=geometry_modes,
+        nargs="+",
+        default=geometry_modes,
+        help="Geometry modes to compare (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max_cells",
+        type=int,
+        default=1200,
+        help="Skip the incremental mode above this many cells, \
+            as it grows quadratically (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Report the best of this many runs (default: %(default)s)",
+    )
+    parsed = parser.parse_args()
+
+    print(f"{'board':>12} {'grid':>9} {'cells':>7}" +
+          "".join(f" {m:>12}" for m in parsed.modes))
+    for board_type in parsed.board_type:
+        for rows in parsed.sizes:
+            cols = rows * 4 // 3
+            line = f"{board_type:>12} {f'{rows}x{cols}':>9} {rows * cols:>7}"
+            for mode in parsed.modes:
+                if mode == "incremental" and rows * cols > parsed.max_cells:
+                    line += f" {'skipped':>12}"
+                    continue
+                t = build_time(board_type, rows, cols, mode, parsed.repeat)
+                line += f" {t:>11.3f}s"
+            print(line, flush=True)
@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from orpc_io import image_extensions, load_orpc_files
+
+# Metrics compared against a baseline: whether higher is better, and which
+# tolerance applies
+compared_metrics = {
+    "images_per_second": (True, "time"),
+    "latency.p50": (False, "time"),
+    "latency.p99": (False, "time"),
+    "peak_rss_mb": (False, "memory"),
+    "accuracy.recall": (True, "accuracy"),
+    "accuracy.id_errors": (False, "accuracy"),
+    "accuracy.false_detections": (False, "accuracy"),
+    "accuracy.rms_error": (False, "accuracy"),
+}
+
+
+def run_detector(detector: str, target: str, images, work_dir: str):
+    """Run the detector once over all images and time every image
+
+    The detector writes the orpc file of an image next to it, so the images
+    are linked into work_dir and the orpc files land there. The latency of
+    an image is the time between two consecutive "Writing N corners" lines
+    of the detector; the first one includes startup and reading the dsc.
+
+    Returns:
+        wall time [s], latency of each image [s], peak RSS [MB], exit code
+    """
+    links = []
+    for image in images:
+        link = os.path.join(work_dir, os.path.basename(image))
+        os.symlink(os.path.abspath(image), link)
+        links.append(link)
+
+    start = time.perf_counter()
+    process = subprocess.Popen([detector, "-t", target, "-f", *links],
+                               stdout=subprocess.PIPE, text=True)
+    stamps = [start]
+    for line in process.stdout:
+        if line.startswith("Writing ") and " corners to " in line:
+            stamps.append(time.perf_counter())
+    process.stdout.close()
+    # wait4 also returns the resource usage of this child alone
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return wall, np.diff(stamps), usage.ru_maxrss / 1024, process.returncode
+
+
+def latency_summary(latencies: np.ndarray) -> dict:
+    """Percentiles of the latencies [ms], excluding the first image (startup)
+    unless it is the only one"""
+    steady = latencies[1:] if len(latencies) > 1 else latencies
+    if len(steady) == 0:
+        return {}
+    ms = steady * 1000
+    return {"first": float(latencies[0] * 1000), "mean": float(ms.mean()),
+            "p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)), "max": float(ms.max())}
+
+
+def match_corners(frame_a, xy_a, frame_b, xy_b, radius: float):
+    """One-to-one matches between points a and b of the same frame within
+    radius, closest pairs first
+
+    Points a are hashed on a grid of radius-sized cells, so each point b
+    only visits the 3x3 cells around it, as a radius query of a KD-tree.
+
+    Returns:
+        index_a, index_b, distance of every matched pair
+    """
+    cell_a = np.floor(xy_a / radius).astype(np.int64)
+    cell_b = np.floor(xy_b / radius).astype(np.int64)
+    if len(cell_a) == 0 or len(cell_b) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    low = np.minimum(cell_a.min(axis=0), cell_b.min(axis=0)) - 1
+    dims = (max(frame_a.max(), frame_b.max()) + 1,
+            *(np.maximum(cell_a.max(axis=0), cell_b.max(axis=0)) - low + 2))
+
+    def keys(frame, cell):
+        return np.ravel_multi_index((frame, cell[:, 0] - low[0], cell[:, 1] - low[1]), dims)
+
+    order = np.argsort(keys(frame_a, cell_a), kind="stable")
+    sorted_keys = keys(frame_a, cell_a)[order]
+    index_a, index_b = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            query = keys(frame_b, cell_b + [dx, dy])
+            lo = np.searchsorted(sorted_keys, query, "left")
+            counts = np.searchsorted(sorted_keys, query, "right") - lo
+            # every point a in the cell, for every point b
+            within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            index_a.append(order[np.repeat(lo, counts) + within])
+            index_b.append(np.repeat(np.arange(len(query)), counts))
+    index_a, index_b = np.concatenate(index_a), np.concatenate(index_b)
+    distance = np.hypot(*(xy_a[index_a] - xy_b[index_b]).T)
+
+    # Greedy matching, closest pairs first: every round keeps the pairs that
+    # are the closest of both of their points, then drops the matched points
+    near = distance <= radius
+    order = np.argsort(distance[near], kind="stable")
+    index_a, index_b = index_a[near][order], index_b[near][order]
+    matched_a, matched_b = [], []
+    while len(index_a):
+        _, first = np.unique(index_b, return_index=True)
+        first = np.sort(first)
+        _, unique_a = np.unique(index_a[first], return_index=True)
+        keep = first[unique_a]
+        matched_a.append(index_a[keep])
+        matched_b.append(index_b[keep])
+        free = ~np.isin(index_a, index_a[keep]) & ~np.isin(index_b, index_b[keep])
+        index_a, index_b = index_a[free], index_b[free]
+
+    index_a = np.concatenate(matched_a) if matched_a else np.empty(0, dtype=np.int64)
+    index_b = np.concatenate(matched_b) if matched_b else np.empty(0, dtype=np.int64)
+    return index_a, index_b, np.hypot(*(xy_a[index_a] - xy_b[index_b]).T)
+
+
+def accuracy(ground_truth_files, detection_files, radius: float, jobs: int = 0) -> dict:
+    """Match detected corners to the ground truth of the same image (orpc
+    files with the same name); missing detection files count as no corners"""
+    truth = load_orpc_files(ground_truth_files, jobs)
+    existing = [f for f in detection_files if os.path.exists(f)]
+    detected = load_orpc_files(existing, jobs)
+    frame_of = {os.path.basename(f): k for k, f in enumerate(ground_truth_files)}
+    detected_frame = np.array([frame_of[os.path.basename(f)] for f in existing],
+                              dtype=np.int64)[detected.frame]
+
+    index_t, index_d, distance = match_corners(
+        truth.frame.astype(np.int64), np.column_stack([truth.x, truth.y]),
+        detected_frame, np.column_stack([detected.x, detected.y]), radius)
+    id_errors = int(np.count_nonzero((truth.board[index_t] != detected.board[index_d]) |
+                                     (truth.point[index_t] != detected.point[index_d])))
+    num_truth, num_detected = len(truth.x), len(detected.x)
+    return {
+        "ground_truth_corners": num_truth,
+        "detected_corners": num_detected,
+        "matched": len(index_t),
+        "recall": len(index_t) / num_truth if num_truth else 1.0,
+        "id_errors": id_errors,
+        "id_error_rate": id_errors / len(index_t) if len(index_t) else 0.0,
+        "false_detections": num_detected - len(index_t),
+        "rms_error": float(np.sqrt(np.mean(distance**2))) if len(distance) else 0.0,
+        "frames_without_output": len(detection_files) - len(existing),
+    }
+
+
+def get_metric(results: dict, name: str):
+    for key in name.split("."):
+        results = results.get(key, {}) if isinstance(results, dict) else {}
+    return results if isinstance(results, (int, float)) else None
+
+
+def find_regressions(results: dict, baseline: dict, tolerances: dict):
+    """Metrics worse than the baseline by more than their relative tolerance"""
+    regressions = []
+    for name, (higher_is_better, kind) in compared_metrics.items():
+        current, base = get_metric(results, name), get_metric(baseline, name)
+        if current is None or base is None:
+            continue
+        tolerance = tolerances[kind]
+        worse = current < base * (1 - tolerance) if higher_is_better else current > base * (1 + tolerance)
+        if worse:
+            regressions.append((name, base, current))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the detector over an image corpus with ground truth "
+        "(see synthetic_images.py), and compare the results against a baseline."
+    )
+    parser.add_argument(
+        "corpus",
+        help="Corpus directory with images/, ground_truth/ (orpc files named after the images) and a dsc file",
+    )
+    parser.add_argument(
+        "--detector",
+        default=os.path.join("build", "apps", "deltille_detector"),
+        help="Detector executable (default: %(default)s)",
+    )
+    parser.add_argument("--target", default="", help="Target dsc file (default: the dsc file of the corpus)")
+    parser.add_argument(
+        "--radius",
+        type=float,
+        default=3.0,
+        help="Maximum distance of a detection to its ground truth corner [pixel] (default: %(default)s)",
+    )
+    parser.add_argument("--output", default="", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default="", help="Baseline results (JSON) to compare against")
+    parser.add_argument(
+        "--update_baseline",
+        action="store_true",
+        help="Overwrite the baseline with these results instead of comparing",
+    )
+    parser.add_argument(
+        "--time_tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative slowdown of the throughput and latencies (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--memory_tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative growth of the peak RSS (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--accuracy_tolerance",
+        type=float,
+        default=0.0,
+        help="Allowed relative loss of every accuracy metric (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of processes parsing orpc files; 0 uses all cores (default: %(default)s)",
+    )
+    parsed = parser.parse_args()
+
+    images = sorted(f for f in glob.glob(os.path.join(parsed.corpus, "images", "*"))
+                    if os.path.splitext(f)[1].lower() in image_extensions)
+    targets = [parsed.target] if parsed.target else glob.glob(os.path.join(parsed.corpus, "*.dsc"))
+    if not os.path.isfile(parsed.detector):
+        print(f"[ERROR] Detector \'{parsed.detector}\' not found")
+        print("\tBuild it first (see How to compile), or set --detector.")
+        sys.exit(0)
+    if len(targets) != 1 or not os.path.isfile(targets[0]):
+        print(f"[ERROR] Expected one dsc file, found {targets}")
+        print("\tSet the target with --target.")
+        sys.exit(0)
+    if not images:
+        print(f"[ERROR] No images in {os.path.join(parsed.corpus, 'images')}")
+        sys.exit(0)
+
+    stems = [os.path.splitext(os.path.basename(f))[0] for f in images]
+    ground_truth = [os.path.join(parsed.corpus, "ground_truth", s + ".orpc") for s in stems]
+    with tempfile.TemporaryDirectory() as work_dir:
+        wall, latencies, peak_rss, returncode = run_detector(parsed.detector, targets[0], images, work_dir)
+        if returncode != 0:
+            print(f"[ERROR] The detector exited with code {returncode}")
+            sys.exit(1)
+        detections = [os.path.join(work_dir, s + ".orpc") for s in stems]
+        results = {
+            "detector": parsed.detector,
+            "target": targets[0],
+            "num_images": len(images),
+            "wall_time": wall,
+            "images_per_second": len(images) / wall,
+            "latency": latency_summary(latencies),
+            "peak_rss_mb": peak_rss,
+            "accuracy": accuracy(ground_truth, detections, parsed.radius, parsed.jobs),
+        }
+
+    print(json.dumps(results, indent=1))
+    if parsed.output:
+        with open(parsed.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if parsed.baseline and parsed.update_baseline:
+        with open(parsed.baseline, "w") as f:
+            json.dump(results, f, indent=1)
+        print(f"Baseline updated: {parsed.baseline}")
+    elif parsed.baseline:
+        with open(parsed.baseline) as f:
+            baseline = json.load(f)
+        tolerances = {"time": parsed.time_tolerance, "memory": parsed.memory_tolerance,
+                      "accuracy": parsed.accuracy_tolerance}
+        regressions = find_regressions(results, baseline, tolerances)
+        for name, base, current in regressions:
+            print(f"[REGRESSION] {name}: {base:g} (baseline) -> {current:g}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {parsed.baseline}")
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+import math
+import numpy as np
+
+from board_design import BoardDesign
+
+s60 = math.sqrt(3.0) / 2
+c60 = 0.5
+
+# Corners of the cell at (i, j) in the order they are counted (the first one
+# takes the tag id of the cell), and the number of cells sharing a valid corner
+cell_corners = {
+    "checkerboard": ([(0, 0), (0, 1), (1, 0), (1, 1)], 2),
+    "deltille": ([(0, 0), (0, 1), (1, 0)], 3),
+}
+
+
+def ij_to_xy(board_type: str, i, j, size):
+    """Convert point index to location"""
+    if board_type == "deltille":
+        return [(i * c60 + j) * size, i * s60 * size]
+    return [j * size, i * size]
+
+
+def cell_tag_ids(grid: np.ndarray, tag_id_offset: int):
+    """Return row/col indices of all non-empty cells in row-major order
+    (i.e. the drawing order) together with their tag ids (-1 if not a tag)
+    """
+    ii, jj = np.nonzero(grid)
+    is_tag = grid[ii, jj] == 2
+    tag_ids = np.full(len(ii), -1)
+    tag_ids[is_tag] = tag_id_offset + np.arange(np.count_nonzero(is_tag))
+    return ii, jj, tag_ids
+
+
+def corner_table(board_type: str, grid: np.ndarray, tag_id_offset: int):
+    """Return the row/col indices, tag ids and counts of every corner of the
+    non-empty cells, in the order the corners are first reached when drawing
+    the cells. Each cell counts its corners once and gives its tag id to the
+    first one (-1 to the others); a corner keeps the max tag id."""
+    corners, _ = cell_corners[board_type]
+    di, dj = np.array(corners).T
+    ii, jj, tag_ids = cell_tag_ids(grid, tag_id_offset)
+
+    # Contributions of every cell, cell by cell (the drawing order)
+    ci = (ii[:, None] + di[None, :]).ravel()
+    cj = (jj[:, None] + dj[None, :]).ravel()
+    contributed = np.full((len(ii), len(corners)), -1)
+    contributed[:, 0] = tag_ids
+    contributed = contributed.ravel()
+
+    # Scatter them onto the corner lattice
+    corner_cols = grid.shape[1] + 1
+    num_corners = (grid.shape[0] + 1) * corner_cols
+    index = ci * corner_cols + cj
+    counts = np.bincount(index, minlength=num_corners)
+    max_tag_ids = np.full(num_corners, -1)
+    np.maximum.at(max_tag_ids, index, contributed)
+    first = np.full(num_corners, len(index))
+    np.minimum.at(first, index, np.arange(len(index)))
+
+    reached = np.flatnonzero(counts)
+    reached = reached[np.argsort(first[reached])]
+    i, j = np.divmod(reached, corner_cols)
+    return i, j, max_tag_ids[reached], counts[reached]
+
+
+def board_description(board_id: int, board_design: BoardDesign, tag_id_offset: int = 0) -> str:
+    """Target description (dsc) of a board. It only depends on the grid,
+    size, tag family and tag ids, so no geometry is built."""
+    grid = np.array(board_design.grid)
+    rows, cols = grid.shape
+    size = board_design.size
+    description = f'{board_id},{cols-1},{rows-1},{size}\n' +\
+                  f'{board_design.tag_family},{board_design.tag_border}\n'
+
+    _, valid_count = cell_corners[board_design.board_type]
+    i, j, tag_ids, counts = corner_table(board_design.board_type, grid,
+                                         board_design.tag_id_offset + tag_id_offset)
+
+    # A valid corner should have been counted by every cell sharing it
+    valid = counts == valid_count
+    i_orig, j_orig = (1, 1)  # set (1, 1) as origin
+    i_new, j_new = i[valid] - i_orig, j[valid] - j_orig
+    x, y = ij_to_xy(board_design.board_type, i_new, j_new, size)
+
+    # Format all lines at once; tolist() keeps the Python number formatting
+    n = len(i_new)
+    items = np.empty((n, 5), dtype=object)
+    for k, column in enumerate([tag_ids[valid], j_new, i_new, x, y]):
+        items[:, k] = np.broadcast_to(column, n).tolist()
+    return description + ("%s,%s,%s,%s,%s,0\n" * n) % tuple(items.ravel())
@@ -3,6 +3,14 @@
 import numpy as np
 from typing import List
 
+# How boards build their polygons:
+# "incremental": merge every primitive into the board as soon as it is drawn
+# "batch": collect all primitives and merge them with one cascaded union
+# "vectorized": build all primitives at once with NumPy, then merge them like "batch"
+# "lattice": trace the outlines directly on the integer lattice without any union
+geometry_modes = ["incremental", "batch", "vectorized", "lattice"]
+
+
 class BoardDesign:
     """Class to store single board specification
 
@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+
+import math
+import struct
+import sys
+import zlib
+import numpy as np
+
+
+from board_design import BoardDesign
+from board_description import cell_tag_ids
+from tags.families import apriltag_families, deltag_families, get_codes, get_num_bits, unpack_bits
+
+s60 = math.sqrt(3.0) / 2
+c60 = 0.5
+
+WHITE = 255
+BLACK = 0
+
+
+class RasterBoard:
+    """Grid and tag codes of a board, all that BoardRasterizer reads
+
+    Unlike AprilCheckerBoard and DeltilleBoard, no polygon is built, so
+    rendering a raster does not load shapely nor pyx.
+    """
+    def __init__(self, board_id: int, board_design: BoardDesign, tag_id_offset: int = 0):
+        families = deltag_families if board_design.board_type == "deltille" else apriltag_families
+        if board_design.tag_family not in families:
+            print(
+                f"[ERROR] \'{board_design.tag_family}\' is unavailable for {board_design.board_type}!")
+            print(
+                f"\tUse one of the following families instead.\n\t{[f for f in families.keys()]}")
+            sys.exit(0)
+
+        self.board_id = board_id
+        self.board_type = board_design.board_type
+        self.grid = np.array(board_design.grid)
+        self.rows, self.cols = self.grid.shape
+        self.size = board_design.size
+        self.tag_family = board_design.tag_family
+        self.codes = get_codes(self.tag_family)
+        self.num_bits = get_num_bits(self.tag_family)
+        self.tag_id_offset = board_design.tag_id_offset + tag_id_offset
+        self.tag_border = board_design.tag_border
+
+    def cell_tag_ids(self):
+        return cell_tag_ids(self.grid, self.tag_id_offset)
+
+
+class BoardRasterizer:
+    """Render a board into a grayscale image straight from its grid and tag bits
+
+    Every pixel is sampled on the board lattice (and on the bit lattice of a
+    tag), so no vector geometry is involved. The image covers the bounding
+    box of the board lattice, with +y of the board pointing up.
+
+    Args:
+        board (RasterBoard): Board to render (a board with grid, size,
+            codes, num_bits, tag_border and cell_tag_ids())
+        deltille (bool): Whether the board is a deltille (else a checkerboard)
+        dpi (float): Resolution [dots per inch]
+        antialias (int): Samples per pixel along each axis (1: no anti-aliasing)
+        max_samples (int): Approximate number of samples evaluated at once
+    """
+    def __init__(self, board, deltille: bool, dpi: float, antialias: int = 1,
+                 max_samples: int = 1 << 21):
+        self.board = board
+        self.deltille = deltille
+        self.dpi = dpi
+        self.antialias = antialias
+        self.pixel_size = 25.4 / dpi  # [mm]
+
+        rows, cols = board.grid.shape
+        if self.deltille:
+            self.width_mm = (cols + rows * c60) * board.size
+            self.height_mm = rows * s60 * board.size
+        else:
+            self.width_mm = cols * board.size
+            self.height_mm = rows * board.size
+        self.shape = (math.ceil(self.height_mm / self.pixel_size),
+                      math.ceil(self.width_mm / self.pixel_size))
+        self.tile_rows = max(1, max_samples // (self.shape[1] * antialias**2))
+
+        # Bits of every tag on the board, and the tag index of every cell
+        ii, jj, tag_ids = board.cell_tag_ids()
+        is_tag = tag_ids >= 0
+        self.tag_index = np.full(board.grid.shape, -1)
+        self.tag_index[ii[is_tag], jj[is_tag]] = np.arange(np.count_nonzero(is_tag))
+        codes = [board.codes[tag_id] for tag_id in tag_ids[is_tag]]
+        self.bits = unpack_bits(codes, board.num_bits)
+
+        # Bit index at each (row, col) of the bit lattice of a tag (-1: none)
+        self.sqrt_bits = round(math.sqrt(board.num_bits))
+        n = self.sqrt_bits
+        if self.deltille:
+            self.one_bit_length = board.size / (n + board.tag_border * 3)
+            self.bit_of = np.full((n, 2 * n - 1), -1)
+            for r in range(n):
+                for c in range((n - 1 - r) * 2 + 1):
+                    self.bit_of[r, c] = -c - r**2 + 2*r*n - 2*r + 2*n - 2
+        else:
+            self.one_bit_length = board.size / (n + board.tag_border * 2)
+            r, c = np.divmod(np.arange(board.num_bits), n)
+            self.bit_of = np.empty((n, n), dtype=int)
+            self.bit_of[r, c] = n - 1 + r * n - c
+        self.border_thickness = board.tag_border * self.one_bit_length
+
+    def lookup_bits(self, tag, r, c):
+        # return whether (r, c) is a set bit of each tag; out of range is unset
+        valid = (r >= 0) & (r < self.bit_of.shape[0]) & (c >= 0) & (c < self.bit_of.shape[1])
+        bit = np.full(r.shape, -1)
+        bit[valid] = self.bit_of[r[valid], c[valid]]
+        valid &= bit >= 0
+        white = np.zeros(r.shape, dtype=bool)
+        white[valid] = self.bits[tag[valid], bit[valid]]
+        return white
+
+    def sample_checkerboard(self, x, y):
+        size = self.board.size
+        rows, cols = self.board.grid.shape
+        i = np.floor(y / size).astype(int)
+        j = np.floor(x / size).astype(int)
+        inside = (i >= 0) & (i < rows) & (j >= 0) & (j < cols)
+        cell = np.zeros(x.shape, dtype=int)
+        cell[inside] = self.board.grid[i[inside], j[inside]]
+        white = cell == 0
+
+        # Tags are black squares with white bits (see draw_apriltag)
+        is_tag = cell == 2
+        ti, tj = i[is_tag], j[is_tag]
+        lx = x[is_tag] - tj * size - self.border_thickness
+        ly = y[is_tag] - ti * size - self.border_thickness
+        r = np.floor(ly / self.one_bit_length).astype(int)
+        c = np.floor(lx / self.one_bit_length).astype(int)
+        white[is_tag] = self.lookup_bits(self.tag_index[ti, tj], r, c)
+        return white
+
+    def sample_deltille(self, x, y):
+        size = self.board.size
+        rows, cols = self.board.grid.shape
+
+        # Lattice coordinates; the lower half of each rhombus is the upright
+        # triangle of the cell, the upper half is never drawn
+        v = y / (s60 * size)
+        u = x / size - v * c60
+        i = np.floor(v).astype(int)
+        j = np.floor(u).astype(int)
+        upright = (u - j) + (v - i) < 1
+        inside = upright & (i >= 0) & (i < rows) & (j >= 0) & (j < cols)
+        cell = np.zeros(x.shape, dtype=int)
+        cell[inside] = self.board.grid[i[inside], j[inside]]
+        white = cell == 0
+
+        # Tags are black triangles with white bits (see draw_deltag)
+        is_tag = cell == 2
+        ti, tj = i[is_tag], j[is_tag]
+        L = self.one_bit_length
+        lv = (y[is_tag] - ti * s60 * size - s60 * self.border_thickness) / (s60 * L)
+        lu = (x[is_tag] - (ti * c60 + tj) * size - 1.5 * self.border_thickness) / L - lv * c60
+        r = np.floor(lv).astype(int)
+        a = np.floor(lu).astype(int)
+        c = 2 * a + ((lu - a) + (lv - r) >= 1)
+        white[is_tag] = self.lookup_bits(self.tag_index[ti, tj], r, c)
+        return white
+
+    def render_rows(self, row_begin: int, row_end: int) -> np.ndarray:
+        """Render image rows [row_begin, row_end) as a uint8 array"""
+        width = self.shape[1]
+        sample = self.sample_deltille if self.deltille else self.sample_checkerboard
+        count = np.zeros((row_end - row_begin, width), dtype=np.uint16)
+        offsets = (np.arange(self.antialias) + 0.5) / self.antialias
+        for oy in offsets:
+            y = self.height_mm - (np.arange(row_begin, row_end) + oy)[:, None] * self.pixel_size
+            for ox in offsets:
+                x = (np.arange(width) + ox)[None, :] * self.pixel_size
+                count += sample(*np.broadcast_arrays(x, y))
+        return (count.astype(np.uint32) * WHITE // self.antialias**2).astype(np.uint8)
+
+    def tiles(self):
+        """Yield the image as consecutive bands of tile_rows rows"""
+        for row in range(0, self.shape[0], self.tile_rows):
+            yield self.render_rows(row, min(row + self.tile_rows, self.shape[0]))
+
+    def render(self) -> np.ndarray:
+        return np.vstack(list(self.tiles()))
+
+
+def write_png(file: str, rasterizer: BoardRasterizer):
+    """Write a rasterized board to an 8-bit grayscale PNG, tile by tile"""
+    write_png_tiles(file, rasterizer.shape, rasterizer.tiles(), rasterizer.dpi)
+
+
+def write_png_tiles(file: str, shape, tiles, dpi: float = None):
+    """Write an 8-bit grayscale PNG of the given (height, width) from
+    consecutive bands of rows"""
+    height, width = shape
+
+    def chunk(f, tag, data):
+        f.write(struct.pack('>I', len(data)) + tag + data)
+        f.write(struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    with open(file, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+        if dpi is not None:
+            pixels_per_meter = round(dpi / 0.0254)
+            chunk(f, b'pHYs', struct.pack('>IIB', pixels_per_meter, pixels_per_meter, 1))
+        compressor = zlib.compressobj()
+        for tile in tiles:
+            # every scanline starts with filter type 0 (none)
+            scanlines = np.hstack([np.zeros((tile.shape[0], 1), dtype=np.uint8), tile])
+            data = compressor.compress(scanlines.tobytes())
+            if data:
+                chunk(f, b'IDAT', data)
+        chunk(f, b'IDAT', compressor.flush())
+        chunk(f, b'IEND', b'')
+
+
+def write_tiff(file: str, rasterizer: BoardRasterizer, compress: bool = True):
+    """Write a rasterized board to an 8-bit grayscale TIFF, one strip per tile"""
+    height, width = rasterizer.shape
+
+    with open(file, 'wb') as f:
+        f.write(b'II*\x00\x00\x00\x00\x00')  # IFD offset is written at the end
+
+        # Image data
+        strip_offsets, strip_byte_counts = [], []
+        for tile in rasterizer.tiles():
+            data = tile.tobytes()
+            if compress:
+                data = zlib.compress(data)
+            strip_offsets.append(f.tell())
+            strip_byte_counts.append(len(data))
+            f.write(data)
+            if f.tell() % 2:
+                f.write(b'\x00')
+
+        # Values not fitting into the entries of the IFD
+        def write_longs(values):
+            offset = f.tell()
+            f.write(struct.pack(f'<{len(values)}I', *values))
+            return offset
+
+        strip_offsets_pos = write_longs(strip_offsets)
+        strip_byte_counts_pos = write_longs(strip_byte_counts)
+        resolution_pos = write_longs([round(rasterizer.dpi * 1000), 1000])
+
+        # IFD: (tag, type, count, value), type 3: SHORT, 4: LONG, 5: RATIONAL
+        num_strips = len(strip_offsets)
+        entries = [
+            (256, 4, 1, width),
+            (257, 4, 1, height),
+            (258, 3, 1, 8),
+            (259, 3, 1, 8 if compress else 1),
+            (262, 3, 1, 1),
+            (273, 4, num_strips, strip_offsets[0] if num_strips == 1 else strip_offsets_pos),
+            (277, 3, 1, 1),
+            (278, 4, 1, rasterizer.tile_rows),
+            (279, 4, num_strips, strip_byte_counts[0] if num_strips == 1 else strip_byte_counts_pos),
+            (282, 5, 1, resolution_pos),
+            (283, 5, 1, resolution_pos),
+            (296, 3, 1, 2),
+        ]
+        ifd_pos = f.tell()
+        f.write(struct.pack('<H', len(entries)))
+        for tag, type, count, value in entries:
+            if type == 3:
+                f.write(struct.pack('<HHIHH', tag, type, count, value, 0))
+            else:
+                f.write(struct.pack('<HHII', tag, type, count, value))
+        f.write(struct.pack('<I', 0))
+
+        f.seek(4)
+        f.write(struct.pack('<I', ifd_pos))
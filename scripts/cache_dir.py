@@ -0,0 +1,10 @@
+#!/usr/bin/python3
+
+import os
+
+
+def default_cache_dir() -> str:
+    """Directory of the caches of the scripts: $DELTILLE_CACHE_DIR, or
+    ~/.cache/deltille"""
+    return os.environ.get("DELTILLE_CACHE_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "deltille"))
@@ -6,36 +6,40 @@ import sys
 
 from pyx import canvas, color
 import polygon_utils as poly
+import lattice_outline as lattice
 
-from board_design import BoardDesign
-from tags.deltags import delTag16h5, delTag25h7, delTag25h9, delTag36h9, delTag36h11
-from shapely.ops import unary_union
+from glyph_cache import glyph_cache
 
+from board_design import BoardDesign, geometry_modes
+from board_description import board_description, cell_tag_ids
+from tags.families import deltag_families, get_codes, get_num_bits, unpack_bits
+from shapely.ops import unary_union
 
-family2code = {
-    "delTag16h5": (delTag16h5, 16),
-    "delTag25h7": (delTag25h7, 25),
-    "delTag25h9": (delTag25h9, 25),
-    "delTag36h9": (delTag36h9, 36),
-    "delTag36h11": (delTag36h11, 36),
-}
 
 s60 = math.sqrt(3.0) / 2
 c60 = 0.5
 
 
 class DeltilleBoard:
-    def __init__(self, board_id: int, board_design: BoardDesign, tag_id_offset: int = 0):
+    def __init__(self, board_id: int, board_design: BoardDesign, tag_id_offset: int = 0,
+                 geometry_mode: str = "lattice"):
         if board_design.board_type != "deltille":
             print(
                 f"[ERROR] Wrong board type {board_design.board_type} for DeltilleBoard")
             sys.exit(0)
 
-        if board_design.tag_family not in family2code:
+        if board_design.tag_family not in deltag_families:
             print(
                 f"[ERROR] \'{board_design.tag_family}\' is unavailable for Deltille!")
             print(
-                f"\tUse one of the following families instead.\n\t{[f for f in family2code.keys()]}")
+                f"\tUse one of the following families instead.\n\t{[f for f in deltag_families.keys()]}")
+            sys.exit(0)
+
+        if geometry_mode not in geometry_modes:
+            print(
+                f"[ERROR] Unknown geometry mode \'{geometry_mode}\'")
+            print(
+                f"\tUse one of the following modes instead.\n\t{geometry_modes}")
             sys.exit(0)
 
         self.board_id = board_id
@@ -43,52 +47,75 @@ class DeltilleBoard:
         self.rows, self.cols = self.grid.shape
         self.size = board_design.size
         self.tag_family = board_design.tag_family
-        self.codes, self.num_bits = family2code[self.tag_family]
+        self.codes = get_codes(self.tag_family)
+        self.num_bits = get_num_bits(self.tag_family)
         self.tag_id_offset = board_design.tag_id_offset + tag_id_offset
         self.tag_border = board_design.tag_border
-        self.description = f'{self.board_id},{self.cols-1},{self.rows-1},{self.size}\n' +\
-                           f'{self.tag_family},{self.tag_border}\n'
+        self.description = board_description(board_id, board_design, tag_id_offset)
 
         # Internal
+        self.geometry_mode = geometry_mode
         self.bg_polygons = None
         self.fg_polygons = None
-        self.corner_map = {}  # map (r,c) -> (tag_id, count)
+        self.bg_parts = []  # primitives waiting for the final union (batch mode)
+        self.fg_parts = []
 
         # Draw polygons
-        tag_id = self.tag_id_offset
-        for r in range(self.rows):
-            for c in range(self.cols):
-                t = self.grid[r, c]
-                if t == 0:
-                    continue
-                elif t == 1:
-                    self.draw_black_triangle(r, c)
-                elif t == 2:
-                    self.draw_deltag(r, c, tag_id)
-                    tag_id += 1
-
-        # Update description
-        i_orig, j_orig = (1, 1)  # set (1, 1) as origin
-        for (key, value) in self.corner_map.items():
-            i, j = key
-            tag_id, count = value
-            if count == 3:
-                # A valid corner should have been counted three times
-                i_new, j_new = [i - i_orig, j - j_orig]
-                x, y = self.ij_to_xy(i_new, j_new)
-                self.description += f'{tag_id},{j_new},{i_new},{x},{y},0\n'
+        if self.geometry_mode == "lattice":
+            self.draw_lattice()
+        elif self.geometry_mode == "vectorized":
+            self.draw_vectorized()
+        else:
+            tag_id = self.tag_id_offset
+            for r in range(self.rows):
+                for c in range(self.cols):
+                    t = self.grid[r, c]
+                    if t == 0:
+                        continue
+                    elif t == 1:
+                        self.draw_black_triangle(r, c)
+                    elif t == 2:
+                        self.draw_deltag(r, c, tag_id)
+                        tag_id += 1
+
+        # Merge the collected primitives at once
+        if self.geometry_mode in ("batch", "vectorized"):
+            self.bg_polygons = poly.union_polygons(self.bg_parts)
+            self.fg_polygons = poly.union_polygons(self.fg_parts)
+            self.bg_parts, self.fg_parts = [], []
 
     def ij_to_xy(self, i, j):
         """Convert point index to location
         """
         return [(i * c60 + j) * self.size, i * s60 * self.size]
 
-    def update_corner_map(self, i, j, tag_id):
-        if (i, j) not in self.corner_map:
-            self.corner_map[(i, j)] = (tag_id, 1)
+    def cell_tag_ids(self):
+        """Return row/col indices of all non-empty cells in row-major order
+        (i.e. the drawing order) together with their tag ids (-1 if not a tag)
+        """
+        return cell_tag_ids(self.grid, self.tag_id_offset)
+
+    def add_polygons(self, bg_poly, fg_poly=None):
+        """Add background and (optional) foreground primitives to the board"""
+        if self.geometry_mode == "batch":
+            self.bg_parts.append(bg_poly)
+            if fg_poly is not None:
+                self.fg_parts.extend(fg_poly)
+            return
+
+        # Add to background polygons
+        if self.bg_polygons is None:
+            self.bg_polygons = bg_poly
         else:
-            tag_id_prev, count = self.corner_map[(i, j)]
-            self.corner_map[(i, j)] = (max(tag_id, tag_id_prev), count+1)
+            self.bg_polygons = unary_union([self.bg_polygons, bg_poly])
+
+        # Add to foreground polygons
+        if fg_poly is not None:
+            fg_poly = unary_union(fg_poly)
+            if self.fg_polygons is None:
+                self.fg_polygons = fg_poly
+            else:
+                self.fg_polygons = unary_union([self.fg_polygons, fg_poly])
 
     def draw_black_triangle(self, i, j):
         x, y = self.ij_to_xy(i, j)
@@ -96,16 +123,7 @@ class DeltilleBoard:
         # Deltag is expected to be drawn in an upright triangle
         poly_triangle = poly.polygon_triangle(x, y, self.size)
 
-        # Add to background polygons
-        if self.bg_polygons is None:
-            self.bg_polygons = poly_triangle
-        else:
-            self.bg_polygons = unary_union([self.bg_polygons, poly_triangle])
-
-        # Update corners
-        self.update_corner_map(i, j, -1)
-        self.update_corner_map(i, j + 1, -1)
-        self.update_corner_map(i + 1, j, -1)
+        self.add_polygons(poly_triangle)
 
     def draw_deltag(self, i, j, tag_id):
         """Draw a DelTag in a given triangle at (i, j)\\
@@ -124,55 +142,126 @@ class DeltilleBoard:
         # Background is a black triangle
         bg_poly = poly.polygon_triangle(x, y, self.size)
 
-        # Add to background polygons
-        if self.bg_polygons is None:
-            self.bg_polygons = bg_poly
-        else:
-            self.bg_polygons = unary_union([self.bg_polygons, bg_poly])
-
         sqrt_bits = round(math.sqrt(self.num_bits))
         one_bit_length = self.size / (sqrt_bits + self.tag_border * 3)
         border_thickness = self.tag_border * one_bit_length
 
         # Draw white bits
         tag_code = self.codes[tag_id]
-        fg_poly = []
-        for r in range(sqrt_bits):
-            for c in range((sqrt_bits - 1 - r) * 2 + 1):
-                bit = -c - r**2 + 2*r*sqrt_bits - 2*r + 2*sqrt_bits - 2
-                # Note: left-most bit is the 0-th
-                if tag_code & (1 << bit):
-                    x_bit = x + 1.5 * border_thickness + \
-                        one_bit_length * (r * c60 + (c + 1)//2)
-                    y_bit = y + s60 * border_thickness + s60 * one_bit_length * r
-                    if c % 2 == 0:
-                        fg_poly.append(poly.polygon_triangle(
-                            x_bit, y_bit, one_bit_length))
-                    else:
-                        fg_poly.append(poly.polygon_triangle60(
-                            x_bit, y_bit, one_bit_length))
-        fg_poly = unary_union(fg_poly)
-
-        # Add to foreground polygons
-        if self.fg_polygons is None:
-            self.fg_polygons = fg_poly
+        if self.geometry_mode == "incremental":
+            fg_poly = []
+            for r in range(sqrt_bits):
+                for c in range((sqrt_bits - 1 - r) * 2 + 1):
+                    bit = -c - r**2 + 2*r*sqrt_bits - 2*r + 2*sqrt_bits - 2
+                    # Note: left-most bit is the 0-th
+                    if tag_code & (1 << bit):
+                        x_bit = x + 1.5 * border_thickness + \
+                            one_bit_length * (r * c60 + (c + 1)//2)
+                        y_bit = y + s60 * border_thickness + s60 * one_bit_length * r
+                        if c % 2 == 0:
+                            fg_poly.append(poly.polygon_triangle(
+                                x_bit, y_bit, one_bit_length))
+                        else:
+                            fg_poly.append(poly.polygon_triangle60(
+                                x_bit, y_bit, one_bit_length))
         else:
-            self.fg_polygons = unary_union([self.fg_polygons, fg_poly])
+            fg_poly = list(poly.translate_polygons(self.tag_glyph(tag_code), (x, y)))
+        self.add_polygons(bg_poly, fg_poly)
+
+    def tag_glyph(self, tag_code):
+        """Return the white bits of a DelTag as polygons relative to the
+        bottom-left corner of its triangle. Glyphs are traced on the lattice
+        of bits and cached by (family, code, border, size).
+        """
+        def build():
+            sqrt_bits = round(math.sqrt(self.num_bits))
+            one_bit_length = self.size / (sqrt_bits + self.tag_border * 3)
+            border_thickness = self.tag_border * one_bit_length
+            cells = []
+            for r in range(sqrt_bits):
+                for c in range((sqrt_bits - 1 - r) * 2 + 1):
+                    bit = -c - r**2 + 2*r*sqrt_bits - 2*r + 2*sqrt_bits - 2
+                    if tag_code & (1 << bit):
+                        if c % 2 == 0:
+                            cells.append(lattice.triangle_cell((c + 1)//2, r))
+                        else:
+                            cells.append(lattice.triangle60_cell((c + 1)//2, r))
+            return lattice.outlines_to_polygons(
+                lattice.trace_outlines(cells),
+                (1.5 * border_thickness, s60 * border_thickness),
+                lattice.TRIANGULAR_BASIS, one_bit_length)
+
+        key = (self.tag_family, tag_code, self.tag_border, self.size)
+        return glyph_cache.get(key, build)
+
+    def draw_vectorized(self):
+        """Draw all black triangles and DelTags of the grid at once.
+        Same geometry as draw_black_triangle/draw_deltag, but the cells and
+        the white bits of every tag are computed as NumPy arrays.
+        """
+        ii, jj, tag_ids = self.cell_tag_ids()
+        is_tag = tag_ids >= 0
+        x, y = self.ij_to_xy(ii, jj)
+
+        # Background is a black triangle for every cell
+        self.bg_parts.extend(poly.polygons_triangle(x, y, self.size))
+
+        # Draw white bits of all tags (see draw_deltag for the layout)
+        sqrt_bits = round(math.sqrt(self.num_bits))
+        one_bit_length = self.size / (sqrt_bits + self.tag_border * 3)
+        border_thickness = self.tag_border * one_bit_length
+
+        r = np.concatenate([np.full((sqrt_bits - 1 - k) * 2 + 1, k)
+                            for k in range(sqrt_bits)])
+        c = np.concatenate([np.arange((sqrt_bits - 1 - k) * 2 + 1)
+                            for k in range(sqrt_bits)])
+        bit = -c - r**2 + 2*r*sqrt_bits - 2*r + 2*sqrt_bits - 2
+        codes = [self.codes[tag_id] for tag_id in tag_ids[is_tag]]
+        bits = unpack_bits(codes, self.num_bits)[:, bit]
+
+        x_bit = x[is_tag, None] + 1.5 * border_thickness + \
+            one_bit_length * (r * c60 + (c + 1)//2)
+        y_bit = y[is_tag, None] + s60 * border_thickness + s60 * one_bit_length * r
+        upright = bits & (c % 2 == 0)
+        inverted = bits & (c % 2 == 1)
+        self.fg_parts.extend(poly.polygons_triangle(
+            x_bit[upright], y_bit[upright], one_bit_length))
+        self.fg_parts.extend(poly.polygons_triangle60(
+            x_bit[inverted], y_bit[inverted], one_bit_length))
+
+    def draw_lattice(self):
+        """Draw all black triangles and DelTags of the grid by tracing their
+        outlines on the triangular lattice, instead of merging polygons.
+        The white bits of a tag come from its glyph (see tag_glyph).
+        """
+        ii, jj, tag_ids = self.cell_tag_ids()
+
+        # Background is a black triangle for every cell
+        outlines = lattice.trace_outlines(
+            lattice.triangle_cell(j, i) for i, j in zip(ii.tolist(), jj.tolist()))
+        bg_polygons = lattice.outlines_to_polygons(
+            outlines, (0.0, 0.0), lattice.TRIANGULAR_BASIS, self.size)
+
+        # Draw white bits by moving the glyph of each tag into place
+        glyphs, offsets = [], []
+        for i, j, tag_id in zip(ii.tolist(), jj.tolist(), tag_ids.tolist()):
+            if tag_id < 0:
+                continue
+            glyph = self.tag_glyph(self.codes[tag_id])
+            glyphs.extend(glyph)
+            offsets.extend([self.ij_to_xy(i, j)] * len(glyph))
+        fg_polygons = list(poly.translate_polygons(glyphs, np.reshape(offsets, (-1, 2))))
 
-        # Update corners
-        self.update_corner_map(i, j, tag_id)
-        self.update_corner_map(i, j + 1, -1)
-        self.update_corner_map(i + 1, j, -1)
+        self.bg_polygons = lattice.combine_polygons(bg_polygons)
+        self.fg_polygons = lattice.combine_polygons(fg_polygons)
 
     def draw_to_canvas(self, c: canvas.canvas):
-        # Draw background polygons first
+        # Draw background polygons first, holes stay white as the paper
         if self.bg_polygons is not None:
-            poly.draw_polygons(c, self.bg_polygons,
-                               color.rgb.black, color.rgb.white)
-        # Draw foreground polygons
+            poly.fill_polygons(c, self.bg_polygons, color.rgb.black)
+        # Draw foreground polygons, holes show the black background
         if self.fg_polygons is not None:
-            poly.draw_polygons(c, self.fg_polygons,
-                               color.rgb.white, color.rgb.black)
+            poly.fill_polygons(c, self.fg_polygons, color.rgb.white)
 
     def get_description(self):
         return self.description
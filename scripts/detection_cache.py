@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+import argparse
+import functools
+import hashlib
+import os
+import numpy as np
+
+from cache_dir import default_cache_dir
+from orpc_io import OrpcTable, read_orpc, read_orpc_binary, write_orpc_binary
+
+chunk_size = 1 << 20
+
+# A full cache is trimmed to this fraction of its maximum size, so that the
+# directory is only listed once in a while
+low_water = 0.9
+
+
+def file_digest(file: str) -> str:
+    """BLAKE2b digest of the contents of a file"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_digest(file: str, mtime: float, size: int) -> str:
+    return file_digest(file)
+
+
+def detector_build_id(detector: str) -> str:
+    """Digest of the detector executable, computed once per build"""
+    stat = os.stat(detector)
+    return _cached_digest(os.path.abspath(detector), stat.st_mtime, stat.st_size)
+
+
+class DetectionCache:
+    """Content-addressed cache of detected corners
+
+    The key of an image is the digest of the image bytes, the target dsc
+    and the detector build, so a result is reused only if none of them
+    changed. Every entry is a one-frame binary orpc file named by its key,
+    so a lookup is a single path. The cache keeps at most max_bytes;
+    the least recently used entries (by file mtime, updated on every hit)
+    are evicted first, down to low_water * max_bytes. Unreadable entries
+    are misses, and are removed.
+
+    Args:
+        directory (str): Cache directory (default: detections/ in the
+            $DELTILLE_CACHE_DIR or ~/.cache/deltille directory)
+        max_bytes (int): Maximum total size of the entries
+    """
+    def __init__(self, directory: str = "", max_bytes: int = 1 << 30):
+        self.directory = directory or os.path.join(default_cache_dir(), "detections")
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_bytes = sum(e.stat().st_size for e in self.entries())
+        self.hits = 0
+        self.misses = 0
+
+    def entries(self):
+        return [e for e in os.scandir(self.directory) if e.name.endswith(".orpcb")]
+
+    @staticmethod
+    def key(image: str, target_digest: str, build_id: str) -> str:
+        return hashlib.blake2b((file_digest(image) + target_digest + build_id).encode(),
+                               digest_size=20).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".orpcb")
+
+    def get(self, key: str):
+        """Corners ((n, 5) rows as in an orpc file) and (width, height) of a
+        key, or None"""
+        path = self.path(key)
+        try:
+            table = read_orpc_binary(path, mmap=False)
+            if len(table.width) != 1 or len(table.x) != table.offsets[-1]:
+                raise ValueError(f"{path} is truncated")
+            os.utime(path)  # most recently used
+        except (OSError, ValueError, IndexError) as error:
+            self.misses += 1
+            if not isinstance(error, FileNotFoundError):
+                self.remove(path)
+            return None
+        self.hits += 1
+        corners = np.column_stack([table.board, table.point, table.ordered, table.x, table.y])
+        return corners, (int(table.width[0]), int(table.height[0]))
+
+    def put(self, key: str, corners: np.ndarray, width: int, height: int):
+        """Store the corners of a key, then evict entries over max_bytes"""
+        table = OrpcTable([""], [width], [height], [0, len(corners)], corners[:, 0], corners[:, 1],
+                          np.ones(len(corners), dtype=bool), corners[:, 3], corners[:, 4],
+                          image_files=[key])
+        path = self.path(key)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write_orpc_binary(tmp_path, table)
+        os.replace(tmp_path, path)
+        self.total_bytes += os.path.getsize(path) - previous
+        if self.total_bytes > self.max_bytes:
+            self.evict(int(low_water * self.max_bytes))
+
+    def put_orpc(self, key: str, orpc_file: str):
+        header, corners = read_orpc(orpc_file)
+        self.put(key, corners, header["width"], header["height"])
+
+    def remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self.total_bytes -= size
+
+    def evict(self, target_bytes: int = None):
+        """Remove the least recently used entries until the cache fits
+        target_bytes (default: max_bytes)"""
+        target_bytes = self.max_bytes if target_bytes is None else target_bytes
+        entries = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in self.entries())
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+    def clear(self):
+        for e in self.entries():
+            os.remove(e.path)
+        self.total_bytes = 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Show or trim the detection result cache."
+    )
+    parser.add_argument(
+        "--cache_dir",
+        default=os.path.join(default_cache_dir(), "detections"),
+        help="Cache directory (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max_size",
+        type=float,
+        default=1024.0,
+        help="Trim the cache to this size [MB] (default: %(default)s)",
+    )
+    parser.add_argument("--clear", action="store_true", help="Remove every entry")
+    parsed = parser.parse_args()
+
+    cache = DetectionCache(parsed.cache_dir, int(parsed.max_size * (1 << 20)))
+    if parsed.clear:
+        cache.clear()
+    else:
+        cache.evict()
+    print(f"{len(cache.entries())} entries, {cache.total_bytes / (1 << 20):.1f} MB in {cache.directory}")
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import os
+import struct
+import numpy as np
+
+from typing import List
+
+# One row per corner of a board, as in the corner lines of a dsc file
+corner_dtype = np.dtype([("tag_id", "<i4"), ("col", "<i4"), ("row", "<i4"),
+                         ("x", "<f8"), ("y", "<f8"), ("z", "<f8")], align=True)
+
+# Binary dsc: magic, header length, JSON header (boards), then the corners of
+# all boards as one corner_dtype array starting at a multiple of 8 bytes
+binary_magic = b"DSCBIN1\0"
+
+# Whether integral x, y and z values are written without a decimal point, as
+# the generator writes them
+default_integer_xyz = (False, False, True)
+
+
+class DscBoard:
+    """Definition of one board in a dsc file
+
+    Args:
+        board_id (int): Board id
+        cols (int): Number of corner columns
+        rows (int): Number of corner rows
+        size (float): The size (i.e. edge length) of base polygon [mm]
+        tag_family (str): Tag family
+        tag_border (float): Tag border thickness. Ratio to one bit size
+        corners (np.ndarray): Corners as a corner_dtype array
+        integer_xyz (tuple): Whether integral x, y and z values are written
+            without a decimal point
+
+    size and tag_border keep the type they were read with (int or float),
+    so that a parsed board is formatted back as it was written.
+    """
+    def __init__(self, board_id: int, cols: int, rows: int, size: float,
+                 tag_family: str, tag_border: float, corners: np.ndarray,
+                 integer_xyz: tuple = default_integer_xyz):
+        self.board_id = board_id
+        self.cols = cols
+        self.rows = rows
+        self.size = size
+        self.tag_family = tag_family
+        self.tag_border = tag_border
+        self.corners = corners
+        self.integer_xyz = tuple(integer_xyz)
+
+    @property
+    def triangular(self) -> bool:
+        # same rule as readBoardDefinitions
+        return self.tag_family.startswith("delTag")
+
+    def header(self) -> dict:
+        return {"board_id": self.board_id, "cols": self.cols, "rows": self.rows,
+                "size": self.size, "tag_family": self.tag_family, "tag_border": self.tag_border,
+                "integer_xyz": list(self.integer_xyz)}
+
+    def __repr__(self):
+        return (f"DscBoard(board_id={self.board_id}, cols={self.cols}, rows={self.rows}, "
+                f"size={self.size}, tag_family={self.tag_family}, tag_border={self.tag_border}, "
+                f"corners={len(self.corners)})")
+
+
+def parse_number(text: str):
+    # int if written as an integer, else float
+    text = text.strip()
+    return int(text) if text.lstrip("+-").isdigit() else float(text)
+
+
+def integer_style(values: np.ndarray, integer_tokens: np.ndarray, default: bool) -> bool:
+    # whether the integral values of a column were written without a decimal point
+    integral = values == np.floor(values)
+    return bool(integer_tokens[integral].any()) if integral.any() else default
+
+
+def parse_dsc(text: str) -> List[DscBoard]:
+    """Parse the contents of a dsc file"""
+    lines = text.splitlines()
+    # The second header line of a board starts with its tag family name
+    family_lines = [k for k, line in enumerate(lines) if line[:1].isalpha()]
+    header_lines = set(family_lines) | {k - 1 for k in family_lines}
+
+    # Parse the numbers of all corner lines at once
+    is_corner = np.array([bool(line.strip()) for line in lines], dtype=bool)
+    is_corner[list(header_lines)] = False
+    corner_lines = [line for line, corner in zip(lines, is_corner) if corner]
+    tokens = np.array(",".join(corner_lines).split(",") if corner_lines else [],
+                      dtype=str).reshape(-1, 6)
+    values = tokens.astype(np.float64)
+    xyz = values[:, 3:]
+    integer_tokens = np.char.isdigit(np.char.lstrip(np.char.strip(tokens[:, 3:]), "+-"))
+    corners = np.empty(len(values), dtype=corner_dtype)
+    for k, name in enumerate(corner_dtype.names):
+        corners[name] = values[:, k]
+
+    # Number of corners read up to each line
+    corner_counts = np.cumsum(is_corner)
+    boards = []
+    for b, k in enumerate(family_lines):
+        board_id, cols, rows, size = lines[k - 1].split(",")
+        tag_family, tag_border = lines[k].split(",")
+        begin = corner_counts[k]
+        end = corner_counts[family_lines[b + 1] - 1] if b + 1 < len(family_lines) else len(corners)
+        integer_xyz = [integer_style(xyz[begin:end, k], integer_tokens[begin:end, k], default)
+                       for k, default in enumerate(default_integer_xyz)]
+        boards.append(DscBoard(int(board_id), int(cols), int(rows), parse_number(size),
+                               tag_family, parse_number(tag_border), corners[begin:end],
+                               integer_xyz))
+    return boards
+
+
+def read_dsc(file: str) -> List[DscBoard]:
+    """Read a dsc file, or a binary dsc file (see write_dsc_binary)"""
+    with open(file, "rb") as f:
+        if f.read(len(binary_magic)) == binary_magic:
+            return read_dsc_binary(file)
+    with open(file) as f:
+        return parse_dsc(f.read())
+
+
+def format_number(values: np.ndarray) -> list:
+    # integral values without a decimal point, like the generator writes z
+    return [int(v) if v.is_integer() else v for v in values.tolist()]
+
+
+def format_column(values: np.ndarray, integer: bool) -> list:
+    return format_number(values) if integer else values.tolist()
+
+
+def format_dsc(boards: List[DscBoard]) -> str:
+    """Format boards as the contents of a dsc file"""
+    text = []
+    for board in boards:
+        text.append(f'{board.board_id},{board.cols},{board.rows},{board.size}\n' +
+                    f'{board.tag_family},{board.tag_border}\n')
+        corners = board.corners
+        n = len(corners)
+        items = np.empty((n, 6), dtype=object)
+        for k, name in enumerate(["tag_id", "col", "row"]):
+            items[:, k] = corners[name].tolist()
+        for k, name in enumerate(["x", "y", "z"]):
+            items[:, 3 + k] = format_column(corners[name], board.integer_xyz[k])
+        text.append(("%s,%s,%s,%s,%s,%s\n" * n) % tuple(items.ravel()))
+    return "".join(text)
+
+
+def write_dsc(file: str, boards: List[DscBoard]):
+    with open(file, "w") as f:
+        f.write(format_dsc(boards))
+
+
+def write_dsc_binary(file: str, boards: List[DscBoard]):
+    """Write boards to a binary dsc file, loaded back without parsing"""
+    headers, offset = [], 0
+    for board in boards:
+        headers.append(dict(board.header(), offset=offset, count=len(board.corners)))
+        offset += len(board.corners)
+    header = json.dumps(headers).encode("utf-8")
+    header += b" " * (-(len(binary_magic) + 8 + len(header)) % 8)
+
+    with open(file, "wb") as f:
+        f.write(binary_magic)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for board in boards:
+            f.write(np.ascontiguousarray(board.corners, dtype=corner_dtype).tobytes())
+
+
+def read_dsc_binary(file: str, mmap: bool = True) -> List[DscBoard]:
+    """Read a binary dsc file. With mmap, the corners of every board are
+    read-only views into the memory mapped file."""
+    with open(file, "rb") as f:
+        if f.read(len(binary_magic)) != binary_magic:
+            raise ValueError(f"{file} is not a binary dsc file")
+        header_length, = struct.unpack("<Q", f.read(8))
+        headers = json.loads(f.read(header_length))
+        data_offset = f.tell()
+
+    total = sum(h["count"] for h in headers)
+    if mmap and total > 0:
+        corners = np.memmap(file, dtype=corner_dtype, mode="r", offset=data_offset, shape=(total,))
+    else:
+        corners = np.fromfile(file, dtype=corner_dtype, offset=data_offset, count=total)
+    return [DscBoard(h["board_id"], h["cols"], h["rows"], h["size"], h["tag_family"],
+                     h["tag_border"], corners[h["offset"]:h["offset"] + h["count"]],
+                     h.get("integer_xyz", default_integer_xyz))
+            for h in headers]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a dsc file between the text and the binary formats."
+    )
+    parser.add_argument("input", help="Input dsc file (text or binary)")
+    parser.add_argument(
+        "output",
+        help="Output file; .dscb writes the binary format, anything else the text format",
+    )
+    parsed = parser.parse_args()
+
+    boards = read_dsc(parsed.input)
+    if os.path.splitext(parsed.output)[1] == ".dscb":
+        write_dsc_binary(parsed.output, boards)
+    else:
+        write_dsc(parsed.output, boards)
+    print(f"{len(boards)} boards, {sum(len(b.corners) for b in boards)} corners written to {parsed.output}")
@@ -4,17 +4,61 @@ import os
 import sys
 import numpy as np
 
-from pyx import canvas, document, unit
-from checkerboard import AprilCheckerBoard
-from deltilleboard import DeltilleBoard
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from board_description import board_description
 from parser_options import pattern_generator_option
 from designs.get_pattern_design import get_pattern_design
 
+
+def build_board(board_id, board_design, tag_id_offset, geometry_mode):
+    """Build a board from its design. Boards are independent from each other,
+    so this runs in worker processes as well.
+    """
+    # Not imported at the top, so that --dsc-only does not load shapely and pyx
+    from checkerboard import AprilCheckerBoard
+    from deltilleboard import DeltilleBoard
+
+    if board_design.board_type == 'checkerboard':
+        return AprilCheckerBoard(board_id, board_design, tag_id_offset, geometry_mode)
+    elif board_design.board_type == 'deltille':
+        return DeltilleBoard(board_id, board_design, tag_id_offset, geometry_mode)
+
+
+def map_in_order(executor, fn, *iterables, window=1):
+    """Like executor.map, but keeps at most `window` boards pending so that
+    finished boards do not pile up in memory before they are written
+    """
+    pending = deque()
+    for args in zip(*iterables):
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, *args))
+    while pending:
+        yield pending.popleft().result()
+
+
 if __name__ == "__main__":
     # Setup the argument list
     parser = pattern_generator_option()
     parsed = parser.parse_args()
 
+    # Get a design
+    design = get_pattern_design(parsed.design)
+    base, ext = os.path.splitext(parsed.output)
+
+    # Only write the dsc file, it does not depend on any geometry
+    if parsed.dsc_only:
+        with open(base + ".dsc", "w") as f:
+            for board_id, board_design in enumerate(design):
+                f.write(board_description(board_id, board_design, parsed.tag_id_offset))
+        sys.exit(0)
+
+    # pyx and the writers are only needed from here on
+    from pyx import canvas, document, unit
+    from pdf_stream import StreamingPDFWriter
+    from vector_writer import NativePDFWriter, board_fills, write_svg
+
     # Paper formats
     pf = {
         "a0": document.paperformat.A0,
@@ -29,35 +73,76 @@ if __name__ == "__main__":
     }
     paper_format = pf[parsed.paper_format]
 
-    # Get a design
-    design = get_pattern_design(parsed.design)
-
     # Set default unit
     unit.set(defaultunit="mm")
 
-    # Create a page for each board
+    # Build the boards, in parallel if requested
+    num_boards = len(design)
+    board_args = (range(num_boards), design,
+                  [parsed.tag_id_offset] * num_boards, [parsed.geometry_mode] * num_boards)
+    executor = None
+    if parsed.jobs != 1 and num_boards > 1:
+        jobs = parsed.jobs if parsed.jobs > 0 else os.cpu_count()
+        executor = ProcessPoolExecutor(jobs)
+        if parsed.stream:
+            boards = map_in_order(executor, build_board, *board_args, window=2 * jobs)
+        else:
+            boards = executor.map(build_board, *board_args)
+    else:
+        boards = map(build_board, *board_args)
+
+    # Write pages as soon as they are ready when streaming (the native
+    # backend always does)
+    pdf_stream = None
+    if parsed.stream and parsed.backend == "pyx":
+        pdf_stream = StreamingPDFWriter(parsed.output)
+
+    # The native backend writes every page as soon as it is ready
+    paper_size = (unit.topt(paper_format.width), unit.topt(paper_format.height))
+    native_pdf = None
+    if parsed.backend == "native" and ext.lower() != ".svg":
+        native_pdf = NativePDFWriter(parsed.output, *paper_size)
+
+    # Create a page for each board (in the board order)
     pages = []
     target_dsc = ""
-    for board_id, board_design in enumerate(design):
-        if board_design.board_type == 'checkerboard':
-            board = AprilCheckerBoard(board_id, board_design, parsed.tag_id_offset)
-        elif board_design.board_type == 'deltille':
-            board = DeltilleBoard(board_id, board_design, parsed.tag_id_offset)
+    for board in boards:
+        board_dsc = board.get_description()
+        target_dsc += board_dsc
+
+        if parsed.backend == "native":
+            if native_pdf is not None:
+                native_pdf.add_page(board_fills(board))
+            else:
+                svg_file = parsed.output if num_boards == 1 else f"{base}_{board.board_id}{ext}"
+                write_svg(svg_file, board_fills(board), *paper_size)
+            del board
+            continue
 
         # Draw the board in a fresh canvas
         c = canvas.canvas()
         board.draw_to_canvas(c)
-        board_dsc = board.get_description()
-        target_dsc += board_dsc
         
         # Convert to a page
         p = document.page(c, paperformat=paper_format,
                           rotated=1, centered=1, fittosize=0)
-        pages.append(p)
+        if pdf_stream is not None:
+            pdf_stream.add_page(p)
+        else:
+            pages.append(p)
+        del board, c, p
+
+    if executor is not None:
+        executor.shutdown()
 
-    doc = document.document(pages)
-    doc.writePDFfile(parsed.output)
+    if native_pdf is not None:
+        native_pdf.close()
+    elif pdf_stream is not None:
+        pdf_stream.close()
+    elif parsed.backend == "pyx":
+        doc = document.document(pages)
+        doc.writePDFfile(parsed.output)
 
     # Write a dsc file
-    with open(os.path.splitext(parsed.output)[0] + ".dsc", "w") as f:
+    with open(base + ".dsc", "w") as f:
         f.write(target_dsc)
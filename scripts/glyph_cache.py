@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+
+from collections import OrderedDict
+
+
+class GlyphCache:
+    """Bounded LRU cache of tag glyphs
+
+    A glyph is the foreground geometry of a tag in tag-local coordinates,
+    so it only depends on the tag family, code, border and size, and is
+    translated into place by the boards.
+
+    Args:
+        maxsize (int): Maximum number of glyphs kept in the cache
+    """
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.glyphs = OrderedDict()
+
+    def get(self, key, build):
+        """Return the glyph for key, calling build() to create it on a miss"""
+        if key in self.glyphs:
+            self.hits += 1
+            self.glyphs.move_to_end(key)
+            return self.glyphs[key]
+
+        self.misses += 1
+        glyph = build()
+        self.glyphs[key] = glyph
+        if len(self.glyphs) > self.maxsize:
+            self.glyphs.popitem(last=False)
+        return glyph
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self.glyphs.clear()
+
+    def __len__(self):
+        return len(self.glyphs)
+
+    def __repr__(self):
+        return (f'GlyphCache(hits={self.hits}, misses={self.misses}, '
+                f'size={len(self.glyphs)}, maxsize={self.maxsize})')
+
+
+# Shared by all boards of a process
+glyph_cache = GlyphCache()
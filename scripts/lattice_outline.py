@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+
+import math
+import numpy as np
+import shapely
+
+from shapely.geometry import MultiPolygon
+
+
+# Cells in integer lattice coordinates (u, v), listed counter-clockwise.
+# Square lattice: (u, v) -> (u, v)
+# Triangular lattice: (u, v) -> (u + v * cos60, v * sin60)
+def square_cell(u, v):
+    # return the unit square of which the bottom-left corner is at (u, v)
+    return ((u, v), (u + 1, v), (u + 1, v + 1), (u, v + 1))
+
+
+def triangle_cell(u, v):
+    # return the upright triangle of which the bottom-left corner is at (u, v)
+    return ((u, v), (u + 1, v), (u, v + 1))
+
+
+def triangle60_cell(u, v):
+    # return the inverted triangle of which the bottom corner is at (u, v)
+    return ((u, v), (u, v + 1), (u - 1, v + 1))
+
+
+SQUARE_BASIS = np.array([[1.0, 0.0],
+                         [0.0, 1.0]])
+TRIANGULAR_BASIS = np.array([[1.0, 0.5],
+                             [0.0, math.sqrt(3.0) / 2]])
+
+
+def trace_outlines(cells):
+    """Trace the boundary of the union of lattice cells.
+
+    Edges shared by two cells cancel out and the remaining directed edges are
+    chained into loops, always taking the left-most turn so that regions
+    touching at a single vertex are kept apart. Loops passing a vertex twice
+    are split there, so that a pinched pocket becomes a hole touching its
+    shell. Cells connected through shared edges form one region with one
+    counter-clockwise shell and clockwise holes.
+    As the lattice basis keeps the orientation, all of this is decided on the
+    integer coordinates.
+
+    Args:
+        cells (Iterable): Cells given as tuples of (u, v) vertices, counter-clockwise
+
+    Returns:
+        List[Tuple]: (shell, holes) per region, loops as lists of (u, v) vertices
+    """
+    # Collect directed edges, remembering the cell on their left
+    cells = list(cells)
+    owner = {}
+    for k, cell in enumerate(cells):
+        for a, b in zip(cell, cell[1:] + cell[:1]):
+            owner[(a, b)] = k
+    if not owner:
+        return []
+
+    # Cancel shared edges and join the cells on both sides
+    parent = list(range(len(cells)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    outgoing = {}
+    for (a, b), k in owner.items():
+        other = owner.get((b, a))
+        if other is None:
+            outgoing.setdefault(a, []).append(b)
+        elif k < other:
+            parent[find(k)] = find(other)
+
+    # Follow the boundary, turning left-most at every vertex
+    def turn(a, b, c):
+        # clockwise angle from the reversed edge (b, a) to the edge (b, c)
+        back = math.atan2(a[1] - b[1], a[0] - b[0])
+        ahead = math.atan2(c[1] - b[1], c[0] - b[0])
+        return (back - ahead) % (2 * math.pi)
+
+    def split(loop):
+        # split a loop at the vertices it passes more than once
+        pieces, stack, index = [], [], {}
+        for p in loop:
+            if p in index:
+                k = index[p]
+                pieces.append(stack[k:])
+                for q in stack[k + 1:]:
+                    del index[q]
+                del stack[k + 1:]
+            else:
+                index[p] = len(stack)
+                stack.append(p)
+        pieces.append(stack)
+        return pieces
+
+    visited = set()
+    regions = {}
+    for a, ends in outgoing.items():
+        for b in ends:
+            if (a, b) in visited:
+                continue
+            loop = []
+            edge = (a, b)
+            while edge not in visited:
+                visited.add(edge)
+                p, q = edge
+                loop.append(p)
+                ends_q = outgoing[q]
+                if len(ends_q) == 1:
+                    edge = (q, ends_q[0])
+                else:
+                    edge = (q, min(ends_q, key=lambda r: turn(p, q, r)))
+
+            for piece in split(loop):
+                region = regions.setdefault(find(owner[(piece[0], piece[1])]), [None, []])
+                twice_area = sum(p[0] * q[1] - q[0] * p[1]
+                                 for p, q in zip(piece, piece[1:] + piece[:1]))
+
+                # Drop vertices on straight runs, but keep those touching other
+                # loops so that shared points stay exact after the conversion
+                piece = [q for p, q, r in zip(piece[-1:] + piece[:-1], piece, piece[1:] + piece[:1])
+                         if len(outgoing[q]) > 1 or
+                         (q[0] - p[0]) * (r[1] - q[1]) != (q[1] - p[1]) * (r[0] - q[0])]
+                if twice_area > 0:
+                    region[0] = piece
+                else:
+                    region[1].append(piece)
+
+    return [(shell, holes) for shell, holes in regions.values()]
+
+
+def outlines_to_polygons(outlines, origin, basis, scale=1.0):
+    """Convert traced outlines to polygons in millimeters.
+
+    Args:
+        outlines (List[Tuple]): Outlines from trace_outlines
+        origin (Tuple[float, float]): Location of the lattice point (0, 0)
+        basis (np.ndarray): 2x2 matrix mapping (u, v) to (x, y) of a unit lattice
+        scale (float): Edge length of a lattice cell
+
+    Returns:
+        List[Polygon]: One polygon per region
+    """
+    # Flatten closed rings into one coordinate array with ring and polygon offsets
+    rings = [ring + ring[:1] for shell, holes in outlines for ring in [shell] + holes]
+    if not rings:
+        return []
+    ring_offsets = np.cumsum([0] + [len(ring) for ring in rings])
+    polygon_offsets = np.cumsum([0] + [1 + len(holes) for _, holes in outlines])
+    uv = np.array([p for ring in rings for p in ring], dtype=float)
+    xy = np.asarray(origin) + scale * (uv @ basis.T)
+
+    return list(shapely.from_ragged_array(
+        shapely.GeometryType.POLYGON, xy, (ring_offsets, polygon_offsets)))
+
+
+def combine_polygons(polygons):
+    # combine non-overlapping polygons into one geometry (None if empty)
+    if not polygons:
+        return None
+    if len(polygons) == 1:
+        return polygons[0]
+    return MultiPolygon(polygons)
@@ -0,0 +1,271 @@
+#!/usr/bin/python3
+
+import argparse
+import glob
+import os
+import re
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List
+
+# Header keys written by writeCornersToFile in apps/DeltilleDetector.cpp
+header_keys = ["filename", "width", "height", "num_corners", "encoding"]
+
+# Image files read by the detector, which writes the orpc file of an image
+# next to it
+image_extensions = [".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".pgm"]
+
+# Binary consolidated orpc (see ConsolidatedWriter in apps/DeltilleDetector.cpp):
+# header, the corners of all frames, the index of the frames, then their names
+binary_magic = b"ORPCBIN1"
+binary_header_dtype = np.dtype([("magic", "S8"), ("version", "<u4"), ("reserved", "<u4"),
+                                ("index_offset", "<u8"), ("num_frames", "<u8")])
+binary_corner_dtype = np.dtype([("x", "<f8"), ("y", "<f8"), ("board", "<i4"), ("point", "<i4")])
+binary_frame_dtype = np.dtype([("first", "<u8"), ("count", "<u8"), ("width", "<i4"), ("height", "<i4")])
+
+
+def parse_orpc(text: str):
+    """Parse the contents of an ascii orpc file
+
+    Returns:
+        header (dict), corners ((n, 5) float64 array of boardId, pointId,
+        isOrdered, x, y rows)
+    """
+    header = {}
+    lines = text.split("\n", len(header_keys))
+    for line in lines[:len(header_keys)]:
+        key, _, value = line.partition(": ")
+        header[key] = value if key in ("filename", "encoding") else int(value)
+    if header.get("encoding") != "ascii":
+        raise ValueError(f"Unsupported orpc encoding: {header.get('encoding')}")
+
+    body = lines[len(header_keys)] if len(lines) > len(header_keys) else ""
+    corners = np.array(body.replace(",", " ").split(), dtype=np.float64).reshape(-1, 5)
+    if len(corners) != header["num_corners"]:
+        raise ValueError(f"Expected {header['num_corners']} corners, read {len(corners)}")
+    return header, corners
+
+
+def read_orpc(file: str):
+    with open(file) as f:
+        return parse_orpc(f.read())
+
+
+def format_orpc(filename: str, width: int, height: int, corners: np.ndarray) -> str:
+    """Contents of an orpc file as writeCornersToFile writes them: (n, 5)
+    rows of boardId, pointId, isOrdered, x, y, doubles with max_digits10"""
+    text = f"filename: {filename}\nwidth: {width}\nheight: {height}\n" +\
+           f"num_corners: {len(corners)}\nencoding: ascii\n"
+    rows = [(int(b), int(p), int(o), x, y) for b, p, o, x, y in corners.tolist()]
+    return text + ("%d,%d,%d,%.17g,%.17g\n" * len(rows)) % tuple(v for row in rows for v in row)
+
+
+def parse_orpc_frames(text: str):
+    """Parse orpc contents of any number of frames written back to back, as
+    the detector writes them with --consolidated
+
+    Returns:
+        list of (header, corners) of every frame, see parse_orpc
+    """
+    return [parse_orpc(block) for block in re.split(r"(?m)^(?=filename: )", text) if block]
+
+
+def read_orpc_frames(file: str):
+    with open(file) as f:
+        return parse_orpc_frames(f.read())
+
+
+class OrpcTable:
+    """Corners of many orpc files (frames) in one columnar table
+
+    Rows of frame k are rows offsets[k] to offsets[k + 1] of every column.
+
+    Args:
+        files (List[str]): Orpc file of each frame
+        width (np.ndarray): Image width of each frame
+        height (np.ndarray): Image height of each frame
+        offsets (np.ndarray): First row of each frame, and the number of rows
+        board (np.ndarray): Board id of each corner
+        point (np.ndarray): Point id of each corner
+        ordered (np.ndarray): Whether each corner is ordered
+        x (np.ndarray): Corner x location [pixel]
+        y (np.ndarray): Corner y location [pixel]
+        image_files (List[str]): Image filename of each frame (orpc header)
+    """
+    columns = ["offsets", "board", "point", "ordered", "x", "y"]
+
+    def __init__(self, files, width, height, offsets, board, point, ordered, x, y,
+                 image_files=None):
+        self.files = list(files)
+        self.image_files = list(image_files) if image_files is not None else [""] * len(self.files)
+        self.width = np.asarray(width, dtype=np.int32)
+        self.height = np.asarray(height, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.board = np.asarray(board, dtype=np.int32)
+        self.point = np.asarray(point, dtype=np.int32)
+        self.ordered = np.asarray(ordered, dtype=bool)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+
+    @property
+    def frame(self) -> np.ndarray:
+        """Frame index of each corner"""
+        return np.repeat(np.arange(len(self.files), dtype=np.int32), np.diff(self.offsets))
+
+    def __len__(self):
+        return len(self.files)
+
+    def rows(self, k: int) -> slice:
+        return slice(self.offsets[k], self.offsets[k + 1])
+
+    def save(self, file: str):
+        """Save as an uncompressed npz, which loads without parsing"""
+        np.savez(file, files=np.array(self.files), image_files=np.array(self.image_files),
+                 width=self.width, height=self.height,
+                 mtimes=np.array([os.path.getmtime(f) if os.path.exists(f) else 0.0
+                                  for f in self.files]),
+                 **{name: getattr(self, name) for name in self.columns})
+
+    @staticmethod
+    def load(file: str) -> "OrpcTable":
+        with np.load(file) as data:
+            return OrpcTable(data["files"].tolist(), data["width"], data["height"],
+                             *[data[name] for name in OrpcTable.columns],
+                             image_files=data["image_files"].tolist())
+
+    @staticmethod
+    def is_up_to_date(file: str, files: List[str]) -> bool:
+        """Whether a saved table holds exactly the given orpc files, unchanged"""
+        if not os.path.exists(file):
+            return False
+        with np.load(file) as data:
+            if data["files"].tolist() != list(files):
+                return False
+            mtimes = np.array([os.path.getmtime(f) for f in files])
+            return bool(np.array_equal(data["mtimes"], mtimes))
+
+
+def frames_to_table(files: List[str], parsed) -> OrpcTable:
+    """OrpcTable of parsed (header, corners) frames, coming from files"""
+    headers = [header for header, _ in parsed]
+    corners = np.concatenate([c for _, c in parsed]) if parsed else np.empty((0, 5))
+    offsets = np.concatenate([[0], np.cumsum([len(c) for _, c in parsed])])
+    return OrpcTable(files, [h["width"] for h in headers], [h["height"] for h in headers],
+                     offsets, corners[:, 0], corners[:, 1], corners[:, 2] != 0,
+                     corners[:, 3], corners[:, 4], image_files=[h["filename"] for h in headers])
+
+
+def load_consolidated_orpc(file: str) -> OrpcTable:
+    """OrpcTable of a consolidated orpc file, ascii (one frame per header) or binary"""
+    with open(file, "rb") as f:
+        if f.read(len(binary_magic)) == binary_magic:
+            return read_orpc_binary(file)
+    parsed = read_orpc_frames(file)
+    return frames_to_table([file] * len(parsed), parsed)
+
+
+def read_orpc_binary(file: str, mmap: bool = True) -> OrpcTable:
+    """Read a binary consolidated orpc file. With mmap, the corner columns of
+    the table are read-only views into the memory mapped file."""
+    header = np.fromfile(file, dtype=binary_header_dtype, count=1)[0]
+    if header["magic"] != binary_magic:
+        raise ValueError(f"{file} is not a binary orpc file")
+    num_frames, index_offset = int(header["num_frames"]), int(header["index_offset"])
+    frames = np.fromfile(file, dtype=binary_frame_dtype, count=num_frames, offset=index_offset)
+    with open(file, "rb") as f:
+        f.seek(index_offset + num_frames * binary_frame_dtype.itemsize)
+        names = f.read().decode("utf-8").split("\n") if num_frames else []
+
+    total = int(frames["count"].sum())
+    offset = binary_header_dtype.itemsize
+    if mmap and total > 0:
+        corners = np.memmap(file, dtype=binary_corner_dtype, mode="r", offset=offset, shape=(total,))
+    else:
+        corners = np.fromfile(file, dtype=binary_corner_dtype, count=total, offset=offset)
+    offsets = np.append(frames["first"], total).astype(np.int64)
+    return OrpcTable([file] * num_frames, frames["width"], frames["height"], offsets,
+                     corners["board"], corners["point"], np.ones(total, dtype=bool),
+                     corners["x"], corners["y"], image_files=names)
+
+
+def write_orpc_binary(file: str, table: OrpcTable):
+    """Write the ordered corners of a table to a binary consolidated orpc file"""
+    frame = table.frame[table.ordered]
+    corners = np.empty(len(frame), dtype=binary_corner_dtype)
+    for name in binary_corner_dtype.names:
+        corners[name] = getattr(table, name)[table.ordered]
+    frames = np.empty(len(table), dtype=binary_frame_dtype)
+    frames["count"] = np.bincount(frame, minlength=len(table))
+    frames["first"] = np.cumsum(frames["count"]) - frames["count"]
+    frames["width"], frames["height"] = table.width, table.height
+
+    header = np.zeros(1, dtype=binary_header_dtype)
+    header["magic"], header["version"], header["num_frames"] = binary_magic, 1, len(table)
+    header["index_offset"] = binary_header_dtype.itemsize + corners.nbytes
+    with open(file, "wb") as f:
+        for array in (header, corners, frames):
+            f.write(array.tobytes())
+        f.write("\n".join(table.image_files).encode("utf-8"))
+
+
+def load_orpc_files(files: List[str], jobs: int = 0, processes: bool = True,
+                    cache: str = None) -> OrpcTable:
+    """Parse orpc files in parallel into one OrpcTable
+
+    Args:
+        files (List[str]): Orpc files, one frame each, in frame order
+        jobs (int): Number of workers (0: all cores, 1: no pool)
+        processes (bool): Use a process pool (parsing holds the GIL), else threads
+        cache (str): Npz file of the table. It is loaded instead of parsing when
+            it holds the same, unchanged files, and written otherwise
+    """
+    files = list(files)
+    if cache is not None and OrpcTable.is_up_to_date(cache, files):
+        return OrpcTable.load(cache)
+
+    jobs = jobs if jobs > 0 else os.cpu_count()
+    if jobs == 1 or len(files) < 2:
+        parsed = list(map(read_orpc, files))
+    else:
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool(jobs) as executor:
+            parsed = list(executor.map(read_orpc, files, chunksize=max(1, len(files) // (4 * jobs))))
+
+    table = frames_to_table(files, parsed)
+    if cache is not None:
+        table.save(cache)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load orpc files into one table, saved as an npz file or a binary orpc file."
+    )
+    parser.add_argument("output", help="Output npz file, or binary consolidated orpc file (.orpcb)")
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Orpc files, or directories of orpc files (sorted by name)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of processes parsing files; 0 uses all cores (default: %(default)s)",
+    )
+    parsed = parser.parse_args()
+
+    files = []
+    for path in parsed.inputs:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.orpc"))))
+        else:
+            files.append(path)
+
+    if os.path.splitext(parsed.output)[1] == ".orpcb":
+        table = load_orpc_files(files, parsed.jobs)
+        write_orpc_binary(parsed.output, table)
+    else:
+        table = load_orpc_files(files, parsed.jobs, cache=parsed.output)
+    print(f"{len(table)} frames, {table.offsets[-1]} corners in {parsed.output}")
@@ -3,8 +3,7 @@
 import argparse
 
 from designs.get_pattern_design import name_to_design
-from checkerboard import family2code as apriltag_family
-from deltilleboard import family2code as deltag_family
+from board_design import geometry_modes
 
 
 def pattern_generator_option():
@@ -44,4 +43,106 @@ def pattern_generator_option():
         help="Paper format (a0, a1, ..., a5, letter, legal) (default: %(default)s)",
     )
 
+    # Geometry construction
+    parser.add_argument(
+        "--geometry_mode",
+        choices=geometry_modes,
+        default="lattice",
+        dest="geometry_mode",
+        help="How board polygons are built and merged. \
+            'lattice' traces outlines on the cell lattice without any union; \
+            'vectorized' builds all cells with NumPy and 'batch' cell by cell, both running a single union per board; \
+            'incremental' merges cell by cell (default: %(default)s)",
+    )
+
+    # Parallel board construction
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        dest="jobs",
+        help="Number of processes building boards in parallel. \
+            0 uses all cores. The output is the same as with a single process (default: %(default)s)",
+    )
+
+    # Streaming output
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        dest="stream",
+        help="Write each page to the pdf as soon as its board is built and free the board, \
+            so that memory use does not grow with the number of boards. \
+            The native backend always writes page by page; with it, --stream only bounds the boards built ahead",
+    )
+
+    # Output backend
+    parser.add_argument(
+        "--backend",
+        choices=["pyx", "native"],
+        default="pyx",
+        dest="backend",
+        help="'pyx' draws every board with pyx; 'native' writes the pdf paths straight from the polygon \
+            coordinates, page by page, with the same page layout. \
+            With 'native', an output ending in .svg writes one svg per board (default: %(default)s)",
+    )
+
+    # Description only
+    parser.add_argument(
+        "--dsc-only",
+        action="store_true",
+        dest="dsc_only",
+        help="Only write the dsc file (next to the output filename), without building any geometry",
+    )
+
+    return parser
+
+
+def pattern_raster_option():
+    parser = argparse.ArgumentParser(
+        description="Render the boards of a calibration pattern into images."
+    )
+
+    # Output filename
+    parser.add_argument(
+        "output", nargs="?", default="pattern.png",
+        help="Output image filename (.png, .tif or .tiff). \
+            The board id is appended for designs with multiple boards",
+    )
+
+    # Design selection
+    parser.add_argument(
+        "--design",
+        choices=name_to_design.keys(),
+        default="example_checkerboard",
+        dest="design",
+        help="The design name. A design is defined in designs folder. (default: %(default)s)",
+    )
+
+    # Optional tag id offset
+    parser.add_argument(
+        "--tag_id_offset",
+        type=int,
+        default=0,
+        dest="tag_id_offset",
+        help="Offset to bump the entire tag ids by (default: %(default)s)",
+    )
+
+    # Resolution
+    parser.add_argument(
+        "--dpi",
+        type=float,
+        default=300.0,
+        dest="dpi",
+        help="Image resolution in dots per inch (default: %(default)s)",
+    )
+
+    # Anti-aliasing
+    parser.add_argument(
+        "--antialias",
+        type=int,
+        default=1,
+        dest="antialias",
+        help="Samples per pixel along each axis; 1 renders pixel-exact black and white (default: %(default)s)",
+    )
+
     return parser
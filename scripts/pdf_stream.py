@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+from pyx import document, pdfwriter, writer
+
+
+class _WriterOptions(pdfwriter.PDFwriter):
+    # PDFwriter settings, without writing a whole document in the constructor
+    def __init__(self, compress=True, compresslevel=6):
+        self._fontmap = None
+        self.title = None
+        self.author = None
+        self.subject = None
+        self.keywords = None
+        self.fullscreen = False
+        self.writebbox = False
+        self.compress = compress and pdfwriter.haszlib
+        self.compresslevel = compresslevel
+        self.stripfonts = True
+        self.textaspath = False
+        self.meshasbitmap = False
+        self.meshasbitmapresolution = 300
+        self.encodings = {}
+
+
+class _PDFpages(pdfwriter.PDFobject):
+    # page tree of a streamed document, written once all pages are known
+    def __init__(self):
+        pdfwriter.PDFobject.__init__(self, "pages")
+        self.kids = []
+
+    def write(self, file, writer, registry):
+        file.write("<<\n"
+                   "/Type /Pages\n"
+                   "/Kids [%s]\n"
+                   "/Count %i\n"
+                   ">>\n" % (" ".join(["%i 0 R" % refno for refno in self.kids]),
+                             len(self.kids)))
+
+
+class _PDFcatalog(pdfwriter.PDFobject):
+    def __init__(self, pdfpages):
+        pdfwriter.PDFobject.__init__(self, "catalog")
+        self.pdfpages = pdfpages
+
+    def write(self, file, writer, registry):
+        file.write("<<\n"
+                   "/Type /Catalog\n"
+                   "/Pages %i 0 R\n"
+                   ">>\n" % self.pdfpages.refno)
+
+
+class StreamingPDFWriter:
+    """Write pyx pages to a PDF file one at a time
+
+    pyx's document.writePDFfile needs every page (and so every canvas) in
+    memory until the end. Here each page is converted and written as soon
+    as it is added, and only the object offsets are kept, so the memory use
+    does not grow with the number of pages. The page contents are the same
+    as pyx writes them; resources (e.g. fonts) are not shared between pages.
+
+    Args:
+        file (str): Output pdf filename
+        compress (bool): Compress content streams
+    """
+    def __init__(self, file: str, compress: bool = True):
+        self.file = writer.writer(open(file, "wb"))
+        self.writer = _WriterOptions(compress)
+        self.fileposes = {}
+
+        # The page tree is referenced by every page, reserve its number first
+        self.pdfpages = _PDFpages()
+        self.pdfpages.refno = 1
+        self.refno = 2
+
+        self.file.write_bytes(b"%PDF-1.4\n%\xc3\xb6\xc3\xa9\n")
+
+    def write_object(self, object, registry):
+        self.fileposes[object.refno] = self.file.tell()
+        self.file.write("%i 0 obj\n" % object.refno)
+        object.write(self.file, self.writer, registry)
+        self.file.write("endobj\n")
+
+    def add_page(self, page: document.page):
+        """Write a page; it can be freed right after this call"""
+        registry = pdfwriter.PDFregistry()
+        registry.add(self.pdfpages)
+        pdfpage = pdfwriter.PDFpage(page, len(self.pdfpages.kids), self.pdfpages,
+                                    self.writer, registry)
+        for object in registry.objects[1:]:
+            object.refno = self.refno
+            self.refno += 1
+        for object in registry.objects[1:]:
+            self.write_object(object, registry)
+        self.pdfpages.kids.append(pdfpage.refno)
+
+    def close(self):
+        """Write the page tree, catalog, info and cross-reference table"""
+        registry = pdfwriter.PDFregistry()
+        catalog = _PDFcatalog(self.pdfpages)
+        pdfinfo = pdfwriter.PDFinfo()
+        for object in [catalog, pdfinfo]:
+            object.refno = self.refno
+            self.refno += 1
+            registry.add(object)
+        registry.add(self.pdfpages)
+        for object in [self.pdfpages, catalog, pdfinfo]:
+            self.write_object(object, registry)
+
+        xrefpos = self.file.tell()
+        self.file.write("xref\n"
+                        "0 %d\n"
+                        "0000000000 65535 f \n" % self.refno)
+        for refno in range(1, self.refno):
+            self.file.write("%010i 00000 n \n" % self.fileposes[refno])
+        self.file.write("trailer\n"
+                        "<<\n"
+                        "/Size %i\n"
+                        "/Root %i 0 R\n"
+                        "/Info %i 0 R\n"
+                        ">>\n"
+                        "startxref\n"
+                        "%i\n"
+                        "%%%%EOF\n" % (self.refno, catalog.refno, pdfinfo.refno, xrefpos))
+        self.file.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
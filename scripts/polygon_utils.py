@@ -1,9 +1,13 @@
 #!/usr/bin/python3
 
 import math
+import numpy as np
+import shapely
 
-from pyx import canvas, path, unit
+from pyx import canvas, path, style, unit
 from shapely.geometry import Polygon
+from shapely.geometry.polygon import orient
+from shapely.ops import unary_union
 
 
 def round7(x):
@@ -49,54 +53,90 @@ def polygon_triangle(x, y, width):
     )
 
 
+def polygons_square(x, y, width):
+    # return square polygons at arrays of (x, y) as an array of Polygons
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    coords = np.stack([
+        np.stack([x, y], axis=-1),
+        np.stack([x + width, y], axis=-1),
+        np.stack([x + width, y + width], axis=-1),
+        np.stack([x, y + width], axis=-1),
+    ], axis=-2)
+    return shapely.polygons(np.round(coords, 7))
+
+
+def polygons_triangle60(x, y, width):
+    # return inverted triangles of which the bottom corners are at arrays of (x, y)
+    c60 = 0.5
+    s60 = math.sqrt(3.0) / 2
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    coords = np.stack([
+        np.stack([x, y], axis=-1),
+        np.stack([x + width * c60, y + width * s60], axis=-1),
+        np.stack([x - width * c60, y + width * s60], axis=-1),
+    ], axis=-2)
+    return shapely.polygons(np.round(coords, 7))
+
+
+def polygons_triangle(x, y, width):
+    # return triangles of which the bottom-left corners are at arrays of (x, y)
+    c60 = 0.5
+    s60 = math.sqrt(3.0) / 2
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    coords = np.stack([
+        np.stack([x, y], axis=-1),
+        np.stack([x + width, y], axis=-1),
+        np.stack([x + width * c60, y + width * s60], axis=-1),
+    ], axis=-2)
+    return shapely.polygons(np.round(coords, 7))
+
+
+def translate_polygons(polygons, offsets):
+    # move polygons by (x, y), or each polygon by its own row of (x, y) offsets
+    offsets = np.asarray(offsets, dtype=float)
+    if offsets.ndim == 2:
+        offsets = np.repeat(offsets, shapely.get_num_coordinates(polygons), axis=0)
+    return shapely.transform(polygons, lambda coords: coords + offsets)
+
+
+def union_polygons(polygons):
+    # merge a list of polygons with a single cascaded union (None if empty)
+    if len(polygons) == 0:
+        return None
+    return unary_union(polygons)
+
+
 def draw_polygons(c: canvas.canvas, polygons, fillColor, holeColor=None):
-    # assuming polygons is either "Polygon" or "MultiPolygon"
-    if polygons.geom_type == "Polygon":
-        polylist = [polygons]
-    else:
-        polylist = polygons.geoms
-
-    for poly in polylist:
-        # draw exterior
-        coords = list(poly.exterior.coords)
-        if coords:
-            ppath = path.path(
-                path.moveto_pt(
-                    unit.topt(coords[0][0]), unit.topt(coords[0][1]))
-            )
-            for i in range(1, len(coords)):
-                ppath.append(
-                    path.lineto_pt(
-                        unit.topt(coords[i][0]), unit.topt(coords[i][1]))
-                )
-            ppath.append(
-                path.lineto_pt(
-                    unit.topt(coords[0][0]), unit.topt(coords[0][1]))
-            )
-            ppath.append(path.closepath())
-            c.fill(ppath, [fillColor])
-        else:
-            print("Warning: polygon is empty.")
-
-        # draw interior (there might be multiple)
-        if holeColor is not None:
-            for interior in poly.interiors:
-                coords = list(interior.coords)
-                if coords:
-                    ppath = path.path(
-                        path.moveto_pt(
-                            unit.topt(coords[0][0]), unit.topt(coords[0][1]))
-                    )
-                    for i in range(1, len(coords)):
-                        ppath.append(
-                            path.lineto_pt(
-                                unit.topt(coords[i][0]), unit.topt(
-                                    coords[i][1])
-                            )
-                        )
-                    ppath.append(
-                        path.lineto_pt(
-                            unit.topt(coords[0][0]), unit.topt(coords[0][1]))
-                    )
-                    ppath.append(path.closepath())
-                    c.fill(ppath, [holeColor])
+    # fill the shell of each polygon, holes included, then paint its holes
+    # with holeColor if given
+    for part in shapely.get_parts(polygons):
+        fill_polygons(c, shapely.polygons(part.exterior), fillColor)
+        if holeColor is not None and len(part.interiors) > 0:
+            fill_polygons(c, shapely.polygons(list(part.interiors)), holeColor)
+
+
+def fill_polygons(c: canvas.canvas, polygons, fillColor, even_odd=True):
+    # fill polygons with a single compound path of all their rings
+    # holes are left unpainted, so whatever was drawn below shows through
+    parts = shapely.get_parts(polygons)
+    if not even_odd:
+        # nonzero winding needs shells and holes in opposite directions
+        parts = [orient(part) for part in parts]
+    rings = shapely.get_rings(parts)
+    if len(rings) == 0:
+        print("Warning: polygon is empty.")
+        return
+
+    # convert all coordinates at once
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    coords = coords * unit.topt(1)
+    starts = np.flatnonzero(np.diff(index)) + 1
+
+    ppath = path.path()
+    for ring in np.split(coords, starts):
+        points = list(zip(*ring.T.tolist()))
+        ppath.append(path.moveto_pt(*points[0]))
+        ppath.append(path.multilineto_pt(points[1:]))
+        ppath.append(path.closepath())
+    fillrule = style.fillrule.even_odd if even_odd else style.fillrule.nonzero_winding
+    c.fill(ppath, [fillColor, fillrule])
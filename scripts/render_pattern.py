@@ -0,0 +1,37 @@
+#!/usr/bin/python3
+
+import os
+import sys
+
+from board_raster import BoardRasterizer, RasterBoard, write_png, write_tiff
+from parser_options import pattern_raster_option
+from designs.get_pattern_design import get_pattern_design
+
+if __name__ == "__main__":
+    # Setup the argument list
+    parser = pattern_raster_option()
+    parsed = parser.parse_args()
+
+    # Image writers
+    writers = {
+        ".png": write_png,
+        ".tif": write_tiff,
+        ".tiff": write_tiff,
+    }
+    base, ext = os.path.splitext(parsed.output)
+    if ext.lower() not in writers:
+        print(f"[ERROR] Unknown image format \'{ext}\'")
+        print(f"\tUse one of the following instead.\n\t{[e for e in writers.keys()]}")
+        sys.exit(0)
+
+    # Get a design
+    design = get_pattern_design(parsed.design)
+
+    # Render an image for each board
+    for board_id, board_design in enumerate(design):
+        board = RasterBoard(board_id, board_design, parsed.tag_id_offset)
+        rasterizer = BoardRasterizer(board, board_design.board_type == 'deltille',
+                                     parsed.dpi, parsed.antialias)
+        filename = parsed.output if len(design) == 1 else f'{base}_{board_id}{ext}'
+        print(f'Writing {rasterizer.shape[1]}x{rasterizer.shape[0]} image to : {filename}')
+        writers[ext.lower()](filename, rasterizer)
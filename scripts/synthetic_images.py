@@ -0,0 +1,378 @@
+#!/usr/bin/python3
+
+import argparse
+import functools
+import json
+import math
+import os
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from board_description import board_description, ij_to_xy
+from board_raster import BoardRasterizer, RasterBoard, write_png_tiles
+from dsc_io import parse_dsc
+from orpc_io import format_orpc
+from designs.get_pattern_design import get_pattern_design, name_to_design
+
+camera_models = ["homography", "radial"]
+
+
+class Camera:
+    """Pinhole camera with radial distortion (k1, k2 of the OpenCV model)
+
+    Pixel centers are at integer coordinates, as in OpenCV.
+
+    Args:
+        width (int): Image width [pixel]
+        height (int): Image height [pixel]
+        focal (float): Focal length [pixel]
+        k1 (float): Second order radial distortion coefficient
+        k2 (float): Fourth order radial distortion coefficient
+    """
+    def __init__(self, width: int, height: int, focal: float, k1: float = 0.0, k2: float = 0.0):
+        self.width = width
+        self.height = height
+        self.focal = focal
+        self.cx = (width - 1) / 2
+        self.cy = (height - 1) / 2
+        self.k1 = k1
+        self.k2 = k2
+
+    def distortion(self, r2):
+        return 1 + self.k1 * r2 + self.k2 * r2 * r2
+
+    def monotonic(self, r2):
+        # whether the distorted radius still grows with the radius
+        return 1 + 3 * self.k1 * r2 + 5 * self.k2 * r2 * r2 > 0
+
+    def undistort(self, xd, yd, samples: int = 1 << 16):
+        """Normalized image coordinates of distorted normalized coordinates
+        (nan where no radius distorts to theirs). The radius is inverted by
+        interpolating a dense table of the distortion, which is monotonic."""
+        if self.k1 == 0 and self.k2 == 0:
+            return xd, yd
+        rd = np.hypot(xd, yd)
+        r = np.linspace(0, 4 * max(1.0, rd.max()), samples)
+        monotonic = self.monotonic(r * r)
+        r = r[:len(r) if monotonic.all() else np.argmin(monotonic)]
+        r_undistorted = np.interp(rd, r * self.distortion(r * r), r, right=np.nan)
+        scale = np.divide(r_undistorted, rd, out=np.ones_like(rd), where=rd > 0)
+        return xd * scale, yd * scale
+
+    def project(self, points: np.ndarray):
+        """Project (n, 3) camera coordinates to pixels
+
+        Returns:
+            u, v, valid: Pixel coordinates, and whether each point is in
+            front of the camera where the distortion model holds
+        """
+        z = points[:, 2]
+        valid = z > 0
+        z = np.where(valid, z, 1)
+        x, y = points[:, 0] / z, points[:, 1] / z
+        r2 = x * x + y * y
+        valid &= self.monotonic(r2)
+        scale = self.distortion(r2)
+        return self.focal * x * scale + self.cx, self.focal * y * scale + self.cy, valid
+
+
+def rotation(axis, angle: float) -> np.ndarray:
+    """Rotation matrix of an angle [rad] about a unit axis (Rodrigues)"""
+    kx, ky, kz = axis
+    K = np.array([[0, -kz, ky], [kz, 0, -kx], [-ky, kx, 0]])
+    return np.eye(3) + math.sin(angle) * K + (1 - math.cos(angle)) * K @ K
+
+
+class SyntheticView:
+    """One rendered view of a board on a sheet of paper
+
+    The board lies on z = 0 of its own frame, in the coordinates of
+    BoardRasterizer (+y up, as printed). The paper covers the lattice
+    bounding box plus a margin of one cell.
+
+    Args:
+        rasterizer (BoardRasterizer): Rasterizer of the board
+        camera (Camera): Camera observing the board
+        R (np.ndarray): Rotation from board to camera coordinates
+        t (np.ndarray): Translation from board to camera coordinates [mm]
+        levels (dict): Gray levels in [0, 1] of black, white and background
+    """
+    def __init__(self, rasterizer: BoardRasterizer, camera: Camera, R: np.ndarray,
+                 t: np.ndarray, levels: dict):
+        self.rasterizer = rasterizer
+        self.camera = camera
+        self.R = R
+        self.t = t
+        self.levels = levels
+        self.margin = rasterizer.board.size
+
+    def board_points(self, u, v):
+        """Board coordinates seen by pixels (u, v), and whether the ray hits the board"""
+        cam = self.camera
+        x, y = cam.undistort((u - cam.cx) / cam.focal, (v - cam.cy) / cam.focal)
+        # Intersect the rays (x, y, 1) with the board plane n.(P - t) = 0
+        n = self.R[:, 2]
+        denom = n[0] * x + n[1] * y + n[2]
+        s = (n @ self.t) / np.where(denom != 0, denom, np.inf)
+        hit = s > 0
+        # R^T (P - t), where P = s (x, y, 1)
+        dx, dy, dz = s * x - self.t[0], s * y - self.t[1], s - self.t[2]
+        R = self.R
+        bx = R[0, 0] * dx + R[1, 0] * dy + R[2, 0] * dz
+        by = R[0, 1] * dx + R[1, 1] * dy + R[2, 1] * dz
+        return bx, by, hit
+
+    def render(self, antialias: int = 3, max_samples: int = 1 << 20) -> np.ndarray:
+        """Render the view as a float image in [0, 1]"""
+        rast = self.rasterizer
+        sample = rast.sample_deltille if rast.deltille else rast.sample_checkerboard
+        width, height = self.camera.width, self.camera.height
+        black, white, background = (self.levels[k] for k in ("black", "white", "background"))
+
+        image = np.empty((height, width))
+        band = max(1, max_samples // width)
+        offsets = (np.arange(antialias) + 0.5) / antialias - 0.5
+        for row in range(0, height, band):
+            rows = np.arange(row, min(row + band, height))
+            total = np.zeros((len(rows), width))
+            for oy in offsets:
+                for ox in offsets:
+                    u, v = np.meshgrid(np.arange(width) + ox, rows + oy)
+                    x, y, hit = self.board_points(u, v)
+                    on_paper = hit & (x >= -self.margin) & (x <= rast.width_mm + self.margin) &\
+                        (y >= -self.margin) & (y <= rast.height_mm + self.margin)
+                    value = np.full(x.shape, background)
+                    value[on_paper] = np.where(sample(x[on_paper], y[on_paper]), white, black)
+                    total += value
+            image[rows] = total / antialias**2
+        return image
+
+    def ground_truth(self, dsc_board):
+        """Pixel location of every dsc corner visible in the image
+
+        Returns:
+            point_ids, u, v: Point ids as the detector numbers them (row * cols
+            + col of the dsc), and their exact projections
+        """
+        corners = dsc_board.corners
+        board_type = "deltille" if dsc_board.triangular else "checkerboard"
+        x0, y0 = ij_to_xy(board_type, 1, 1, dsc_board.size)
+        points = np.stack([corners["x"] + x0, corners["y"] + y0, corners["z"]], axis=-1)
+        u, v, valid = self.camera.project(points @ self.R.T + self.t)
+        valid &= (u >= 0) & (u <= self.camera.width - 1) & (v >= 0) & (v <= self.camera.height - 1)
+        point_ids = corners["row"] * dsc_board.cols + corners["col"]
+        return point_ids[valid], u[valid], v[valid]
+
+
+def random_pose(rng, rasterizer: BoardRasterizer, camera: Camera, max_tilt: float,
+                min_fill: float, max_fill: float):
+    """Random board pose: tilted up to max_tilt [deg], rolled in plane, and
+    spanning a fraction of the smaller image side in [min_fill, max_fill]"""
+    margin = rasterizer.board.size
+    extent = max(rasterizer.width_mm, rasterizer.height_mm) + 2 * margin
+    center = np.array([rasterizer.width_mm / 2, rasterizer.height_mm / 2, 0])
+
+    # Face the camera (board +y up in the image), roll, then tilt
+    roll = rotation((0, 0, 1), rng.uniform(-math.pi, math.pi))
+    facing = np.diag([1.0, -1.0, -1.0])
+    axis_angle = rng.uniform(0, 2 * math.pi)
+    tilt = rotation((math.cos(axis_angle), math.sin(axis_angle), 0),
+                    math.radians(rng.uniform(0, max_tilt)))
+    R = tilt @ facing @ roll
+
+    fill = rng.uniform(min_fill, max_fill)
+    side = min(camera.width, camera.height)
+    distance = camera.focal * extent / (fill * side)
+    shift = (1 - fill) / 2 * distance / camera.focal
+    offset = np.array([rng.uniform(-1, 1) * shift * camera.width,
+                       rng.uniform(-1, 1) * shift * camera.height, distance])
+    return R, offset - R @ center
+
+
+def gaussian_blur(image: np.ndarray, sigma: float) -> np.ndarray:
+    """Separable Gaussian blur with reflected borders"""
+    if sigma <= 0:
+        return image
+    radius = max(1, math.ceil(3 * sigma))
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma)**2)
+    kernel /= kernel.sum()
+    for axis in (0, 1):
+        padded = np.pad(image, [(radius, radius) if a == axis else (0, 0) for a in (0, 1)],
+                        mode="reflect")
+        n = image.shape[axis]
+        image = sum(w * padded.take(np.arange(k, k + n), axis=axis) for k, w in enumerate(kernel))
+    return image
+
+
+def apply_camera_effects(image: np.ndarray, rng, camera: Camera, blur: float,
+                         noise: float, vignetting: float) -> np.ndarray:
+    """Vignetting (1 - vignetting at the image corners), blur and Gaussian
+    noise (standard deviation in gray levels), quantized to uint8"""
+    v, u = np.ogrid[:camera.height, :camera.width]
+    r2 = ((u - camera.cx)**2 + (v - camera.cy)**2) / (camera.cx**2 + camera.cy**2)
+    image = gaussian_blur(image * (1 - vignetting * r2), blur) * 255
+    image += rng.normal(0, noise, image.shape) if noise > 0 else 0
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+
+@functools.lru_cache(maxsize=None)
+def get_board(design_name: str, board_id: int, tag_id_offset: int):
+    """Rasterizer and dsc board of a board, built once per process"""
+    board_design = get_pattern_design(design_name)[board_id]
+    board = RasterBoard(board_id, board_design, tag_id_offset)
+    dsc_board, = parse_dsc(board_description(board_id, board_design, tag_id_offset))
+    return BoardRasterizer(board, board_design.board_type == "deltille", 25.4), dsc_board
+
+
+def generate_image(index: int, options: dict) -> dict:
+    """Render image `index` and its ground truth. Every random choice comes
+    from (seed, index), so the output does not depend on the process count."""
+    rng = np.random.default_rng([options["seed"], index])
+    board_id = index % options["num_boards"]
+    rasterizer, dsc_board = get_board(options["design"], board_id, options["tag_id_offset"])
+
+    width, height = options["width"], options["height"]
+    focal = options["focal"] if options["focal"] > 0 else float(width)
+    k1 = k2 = 0.0
+    if options["model"] == "radial":
+        k1 = rng.uniform(-1, 1) * options["distortion"]
+        k2 = rng.uniform(-1, 1) * options["distortion"] / 4
+    camera = Camera(width, height, focal, k1, k2)
+    R, t = random_pose(rng, rasterizer, camera, options["max_tilt"],
+                       options["min_fill"], options["max_fill"])
+
+    black = rng.uniform(0.0, 0.3)
+    levels = {"black": black, "white": rng.uniform(black + 0.4, 1.0),
+              "background": rng.uniform(0.0, 1.0)}
+    effects = {"blur": rng.uniform(0, options["blur"]), "noise": rng.uniform(0, options["noise"]),
+               "vignetting": rng.uniform(0, options["vignetting"])}
+
+    view = SyntheticView(rasterizer, camera, R, t, levels)
+    image = apply_camera_effects(view.render(options["antialias"]), rng, camera, **effects)
+
+    name = f"{options['design']}_{index:06d}"
+    image_file = os.path.join(options["output"], "images", name + ".png")
+    write_png_tiles(image_file, image.shape, [image])
+    point_ids, u, v = view.ground_truth(dsc_board)
+    with open(os.path.join(options["output"], "ground_truth", name + ".orpc"), "w") as f:
+        corners = np.column_stack([np.full(len(u), board_id), point_ids, np.ones(len(u)), u, v])
+        # same filename field as the detector writes (writeCornersToFile)
+        f.write(format_orpc(name + ".jpg", width, height, corners))
+
+    return {"index": index, "image": image_file, "board_id": board_id, "num_corners": len(point_ids),
+            "focal": focal, "k1": k1, "k2": k2, "R": R.tolist(), "t": t.tolist(), **levels, **effects}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render synthetic camera images of the boards of a design, "
+        "with ground truth corners, for benchmarking the detector."
+    )
+    parser.add_argument(
+        "output",
+        help="Output directory; images/, ground_truth/ (orpc), the dsc file and frames.json are written in it",
+    )
+    parser.add_argument(
+        "--design",
+        choices=name_to_design.keys(),
+        default="a4_deltille",
+        help="The design name. Image k shows board k modulo the number of boards (default: %(default)s)",
+    )
+    parser.add_argument("--num_images", type=int, default=100, help="Number of images (default: %(default)s)")
+    parser.add_argument("--width", type=int, default=1280, help="Image width (default: %(default)s)")
+    parser.add_argument("--height", type=int, default=960, help="Image height (default: %(default)s)")
+    parser.add_argument(
+        "--focal",
+        type=float,
+        default=0.0,
+        help="Focal length in pixels; 0 uses the image width (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--model",
+        choices=camera_models,
+        default="homography",
+        help="Camera model; radial adds random k1, k2 distortion (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--distortion",
+        type=float,
+        default=0.2,
+        help="Maximum |k1| of the radial model, |k2| is at most a quarter of it (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max_tilt",
+        type=float,
+        default=50.0,
+        help="Maximum angle between the board normal and the optical axis [deg] (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fill",
+        type=float,
+        nargs=2,
+        default=[0.5, 0.9],
+        metavar=("MIN", "MAX"),
+        help="Range of the paper size relative to the smaller image side (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--blur",
+        type=float,
+        default=1.5,
+        help="Maximum Gaussian blur sigma [pixel] (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--noise",
+        type=float,
+        default=6.0,
+        help="Maximum noise standard deviation [gray level] (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--vignetting",
+        type=float,
+        default=0.4,
+        help="Maximum brightness loss at the image corners (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--antialias",
+        type=int,
+        default=3,
+        help="Samples per pixel along each axis (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--tag_id_offset",
+        type=int,
+        default=0,
+        help="Offset to bump the entire tag ids by (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: %(default)s)")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of processes rendering images; 0 uses all cores (default: %(default)s)",
+    )
+    parsed = parser.parse_args()
+
+    design = get_pattern_design(parsed.design)
+    for directory in ("images", "ground_truth"):
+        os.makedirs(os.path.join(parsed.output, directory), exist_ok=True)
+    with open(os.path.join(parsed.output, parsed.design + ".dsc"), "w") as f:
+        for board_id, board_design in enumerate(design):
+            f.write(board_description(board_id, board_design, parsed.tag_id_offset))
+
+    options = dict(vars(parsed), num_boards=len(design), min_fill=parsed.fill[0],
+                   max_fill=parsed.fill[1])
+    indices = range(parsed.num_images)
+    jobs = parsed.jobs if parsed.jobs > 0 else os.cpu_count()
+    start = time.perf_counter()
+    if jobs == 1:
+        frames = [generate_image(k, options) for k in indices]
+    else:
+        with ProcessPoolExecutor(jobs) as executor:
+            frames = list(executor.map(generate_image, indices, [options] * len(indices),
+                                       chunksize=max(1, len(indices) // (4 * jobs))))
+
+    with open(os.path.join(parsed.output, "frames.json"), "w") as f:
+        json.dump({"design": parsed.design, "options": vars(parsed), "frames": frames}, f, indent=1)
+    print(f"{len(frames)} images, {sum(f['num_corners'] for f in frames)} ground truth corners "
+          f"in {time.perf_counter() - start:.1f}s -> {parsed.output}")
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+
+import argparse
+import functools
+import hashlib
+import itertools
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_dir import default_cache_dir
+from tags.families import apriltag_families, deltag_families, get_codes, get_num_bits, get_shape
+from tags.family_generator import all_rotations, popcount, rotation_permutation
+
+# Same default as TagFamily::errorRecoveryBits
+default_radius = 1
+
+table_dtype = np.dtype([("key", "<u8"), ("value", "<u4")])
+empty_key = np.uint64(0xFFFFFFFFFFFFFFFF)  # no code has all 64 bits set
+golden = np.uint64(0x9E3779B97F4A7C15)
+
+
+def flip_masks(num_bits: int, radius: int):
+    """Every word of at most radius set bits, and its number of set bits"""
+    masks, counts = [np.uint64(0)], [0]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(num_bits), r):
+            masks.append(np.uint64(sum(1 << b for b in bits)))
+            counts.append(r)
+    return np.array(masks, dtype=np.uint64), np.array(counts, dtype=np.uint32)
+
+
+def hash_slots(keys: np.ndarray, capacity_bits: int) -> np.ndarray:
+    # Fibonacci hashing, the top bits of key * 2^64 / golden ratio
+    return ((keys * golden) >> np.uint64(64 - capacity_bits)).astype(np.int64)
+
+
+def build_table(codes, num_bits: int, shape: str, radius: int) -> np.ndarray:
+    """Open-addressing hash table (linear probing) from every word within
+    radius bits of a rotated code to id << 8 | rotation << 4 | distance.
+    A word close to several codes keeps the closest one, then the lowest id
+    and rotation, as TagFamily::decode picks them."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    perm, num_rotations = rotation_permutation(shape, num_bits)
+    rotations = all_rotations(codes, perm, num_rotations)
+
+    # The word observed with rotation k turns into the code after k rotations
+    observed = rotations[:, (num_rotations - np.arange(num_rotations)) % num_rotations]
+    masks, distances = flip_masks(num_bits, radius)
+    n, m = len(codes), len(masks)
+    keys = (observed[:, :, None] ^ masks[None, None, :]).ravel()
+    ids = np.repeat(np.arange(n, dtype=np.uint32), num_rotations * m)
+    rots = np.tile(np.repeat(np.arange(num_rotations, dtype=np.uint32), m), n)
+    dists = np.tile(distances, n * num_rotations)
+
+    order = np.lexsort((rots, ids, dists, keys))
+    keys, ids, rots, dists = keys[order], ids[order], rots[order], dists[order]
+    first = np.append(True, keys[1:] != keys[:-1])
+    keys = keys[first]
+    values = (ids[first] << 8) | (rots[first] << 4) | dists[first]
+
+    # Keep the load factor at most 1/2
+    capacity_bits = max(4, int(2 * len(keys) - 1).bit_length())
+    capacity = 1 << capacity_bits
+    table = np.zeros(capacity, dtype=table_dtype)
+    table["key"] = empty_key
+
+    slots = hash_slots(keys, capacity_bits)
+    pending = np.arange(len(keys))
+    while len(pending):
+        s = slots[pending]
+        free = table["key"][s] == empty_key
+        # the first key claiming a free slot takes it
+        _, first = np.unique(s[free], return_index=True)
+        placed = pending[free][first]
+        table["key"][slots[placed]] = keys[placed]
+        table["value"][slots[placed]] = values[placed]
+        done = np.zeros(len(keys), dtype=bool)
+        done[placed] = True
+        pending = pending[~done[pending]]
+        slots[pending] = (slots[pending] + 1) & (capacity - 1)
+    return table
+
+
+class DecodeIndex:
+    """Decode sampled bit words of a tag family in bulk
+
+    Every word within radius bits of a rotated code is stored in a hash
+    table with its (id, rotation, distance), so decoding is a constant time
+    lookup per word instead of a scan over the codes. The table is built on
+    first use and cached in cache_dir (memory mapped when reloaded).
+
+    Args:
+        family (str): Tag family name, see tags/families.py
+        radius (int): Maximum number of wrong bits, at most (h - 1) / 2
+        cache_dir (str): Directory of cached tables (default: $DELTILLE_CACHE_DIR
+            or ~/.cache/deltille); None to disable the disk cache
+    """
+    def __init__(self, family: str, radius: int = default_radius, cache_dir: str = ""):
+        self.family = family
+        self.codes = get_codes(family)
+        self.num_bits = get_num_bits(family)
+        self.shape = get_shape(family)
+        self.radius = radius
+        min_hamming = int(family.rsplit("h", 1)[1])
+        if not 0 <= radius <= (min_hamming - 1) // 2:
+            raise ValueError(f"The radius of {family} must be between 0 and {(min_hamming - 1) // 2}")
+
+        if cache_dir == "":
+            cache_dir = default_cache_dir()
+        self.path = None
+        if cache_dir is not None:
+            digest = hashlib.sha1(self.codes.tobytes()).hexdigest()[:12]
+            self.path = os.path.join(cache_dir, f"{family}_r{radius}_{digest}.npy")
+
+        if self.path is not None and os.path.exists(self.path):
+            self.table = np.load(self.path, mmap_mode="r")
+        else:
+            self.table = build_table(self.codes, self.num_bits, self.shape, radius)
+            if self.path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, self.table)
+                os.replace(tmp_path, self.path)
+        self.capacity_bits = len(self.table).bit_length() - 1
+
+    def decode(self, words):
+        """Decode an array of sampled words
+
+        Returns:
+            ids, rotations, distances: Arrays shaped like words; ids is -1 (and
+            the others 0) for words farther than radius bits from every code.
+            A word is the code of ids after rotations rotations, as in
+            TagFamily::decode.
+        """
+        words = np.asarray(words, dtype=np.uint64)
+        flat = words.ravel()
+        values = np.full(len(flat), -1, dtype=np.int64)
+
+        keys, table_values = self.table["key"], self.table["value"]
+        mask = len(self.table) - 1
+        slots = hash_slots(flat, self.capacity_bits)
+        pending = np.arange(len(flat))
+        while len(pending):
+            found = keys[slots[pending]]
+            hit = found == flat[pending]
+            values[pending[hit]] = table_values[slots[pending[hit]]]
+            pending = pending[~hit & (found != empty_key)]
+            slots[pending] = (slots[pending] + 1) & mask
+
+        valid = values >= 0
+        ids = np.where(valid, values >> 8, -1).reshape(words.shape)
+        rotations = np.where(valid, (values >> 4) & 0xF, 0).reshape(words.shape)
+        distances = np.where(valid, values & 0xF, 0).reshape(words.shape)
+        return ids, rotations, distances
+
+
+@functools.lru_cache(maxsize=None)
+def get_decode_index(family: str, radius: int = default_radius) -> DecodeIndex:
+    """Decode index of a family, built (or loaded from the disk cache) on first use"""
+    return DecodeIndex(family, radius)
+
+
+if __name__ == "__main__":
+    all_families = list(apriltag_families) + list(deltag_families)
+    parser = argparse.ArgumentParser(
+        description="Build the decode index of tag families into the cache."
+    )
+    parser.add_argument(
+        "families",
+        nargs="*",
+        default=all_families,
+        help=f"Families to index, among {', '.join(all_families)} (default: all)",
+    )
+    parser.add_argument(
+        "--radius",
+        type=int,
+        default=default_radius,
+        help="Maximum number of wrong bits (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        default=default_cache_dir(),
+        help="Directory of the cached tables (default: %(default)s)",
+    )
+    parsed = parser.parse_args()
+
+    for family in parsed.families:
+        if family not in all_families:
+            print(f"[ERROR] Unknown tag family \'{family}\'")
+            print(f"\tUse one of the following families instead.\n\t{all_families}")
+            sys.exit(0)
+
+    for family in parsed.families:
+        start = time.perf_counter()
+        index = DecodeIndex(family, parsed.radius, parsed.cache_dir)
+        print(f"{family}: {len(index.table)} slots, "
+              f"{np.count_nonzero(index.table['key'] != empty_key)} words, "
+              f"{time.perf_counter() - start:.2f}s -> {index.path}", flush=True)
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+import functools
+import os
+import numpy as np
+
+# Tag families and their number of bits. The codes of each family are
+# stored as a uint64 array in <family>.npy next to this file, generated
+# from the code lists in apriltags.py and deltags.py (run this file).
+apriltag_families = {
+    "aprilTag16h5": 16,
+    "aprilTag25h7": 25,
+    "aprilTag25h9": 25,
+    "aprilTag36h9": 36,
+    "aprilTag36h11": 36,
+}
+
+deltag_families = {
+    "delTag16h5": 16,
+    "delTag25h7": 25,
+    "delTag25h9": 25,
+    "delTag36h9": 36,
+    "delTag36h11": 36,
+}
+
+tables_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def table_path(family: str) -> str:
+    return os.path.join(tables_dir, family + ".npy")
+
+
+def get_num_bits(family: str) -> int:
+    if family in apriltag_families:
+        return apriltag_families[family]
+    return deltag_families[family]
+
+
+def get_shape(family: str) -> str:
+    """Shape of the tags (and so of their rotations): square or triangle"""
+    get_num_bits(family)  # raises KeyError for unknown families
+    return "square" if family in apriltag_families else "triangle"
+
+
+@functools.lru_cache(maxsize=None)
+def get_codes(family: str) -> np.ndarray:
+    """Codes of a tag family as a read-only uint64 array, loaded on first use"""
+    get_num_bits(family)  # raises KeyError for unknown families
+    codes = np.load(table_path(family))
+    codes.flags.writeable = False
+    return codes
+
+
+def unpack_bits(codes, num_bits):
+    # return a (len(codes), num_bits) boolean matrix, column k holding bit k
+    codes = np.asarray(codes, dtype=np.uint64).reshape(-1, 1)
+    return ((codes >> np.arange(num_bits, dtype=np.uint64)) & np.uint64(1)).astype(bool)
+
+
+def build_tables():
+    """Write the binary table of every family from the code list modules"""
+    from tags import apriltags, deltags
+
+    for module, families in [(apriltags, apriltag_families), (deltags, deltag_families)]:
+        for family in families:
+            codes = np.array(getattr(module, family), dtype=np.uint64)
+            np.save(table_path(family), codes)
+            print(f"{family}: {len(codes)} codes -> {table_path(family)}")
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.dirname(tables_dir))
+    build_tables()
@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import re
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tags.families import apriltag_families, deltag_families, get_codes, get_num_bits, get_shape
+from tags.family_generator import all_rotations, popcount, rotation_permutation
+
+# Codes along each side of a tile of the distance matrix (bounds memory)
+tile_size = 1024
+
+
+def advertised_hamming(family: str) -> int:
+    # e.g. 11 for aprilTag36h11
+    return int(re.search(r"h(\d+)$", family).group(1))
+
+
+class FamilyAudit:
+    """Distances between the codes of a tag family under rotations
+
+    The distance of a pair of codes is the minimum Hamming distance between
+    any rotation of the first one and the second one, as the detector
+    decodes them. The pairwise distance matrix is computed tile by tile, so
+    only the histogram and the pairs below min_hamming are kept.
+
+    Args:
+        codes (np.ndarray): Codes of the family
+        num_bits (int): Number of bits of a code
+        shape (str): "square" (AprilTag) or "triangle" (DelTag) rotations
+        min_hamming (int): Pairs closer than this are reported as violations
+        max_violations (int): Maximum number of violating pairs kept
+    """
+    def __init__(self, codes, num_bits: int, shape: str, min_hamming: int,
+                 max_violations: int = 100):
+        self.codes = np.asarray(codes, dtype=np.uint64)
+        self.num_bits = num_bits
+        self.min_hamming = min_hamming
+        self.histogram = np.zeros(num_bits + 1, dtype=np.int64)
+        self.num_violations = 0
+        self.violations = []  # (id, id, distance)
+
+        perm, num_rotations = rotation_permutation(shape, num_bits)
+        rotations = all_rotations(self.codes, perm, num_rotations)
+
+        # Distance of every code to its own rotations
+        self.self_distances = popcount(rotations[:, 1:] ^ rotations[:, :1]).min(axis=1)
+
+        n = len(self.codes)
+        for row in range(0, n, tile_size):
+            for col in range(row, n, tile_size):
+                self.audit_tile(rotations[row:row + tile_size], self.codes[col:col + tile_size],
+                                row, col, max_violations)
+
+    def audit_tile(self, rotations, codes, row, col, max_violations):
+        distances = popcount(rotations[:, :, None] ^ codes[None, None, :]).min(axis=1)
+
+        # Only pairs (i, j) with i < j
+        i, j = np.nonzero(np.arange(row, row + len(rotations))[:, None] <
+                          np.arange(col, col + len(codes))[None, :])
+        pair_distances = distances[i, j]
+        self.histogram += np.bincount(pair_distances, minlength=self.num_bits + 1)
+
+        close = np.flatnonzero(pair_distances < self.min_hamming)
+        self.num_violations += len(close)
+        for k in close[:max(0, max_violations - len(self.violations))]:
+            self.violations.append((row + i[k], col + j[k], int(pair_distances[k])))
+
+    @property
+    def min_distance(self) -> int:
+        nonzero = np.flatnonzero(self.histogram)
+        return int(nonzero[0]) if len(nonzero) else None
+
+    def report(self, name: str) -> str:
+        lines = [f"{name}: {len(self.codes)} codes, {self.num_bits} bits, "
+                 f"min. distance {self.min_distance} (required {self.min_hamming}), "
+                 f"min. distance to own rotations {self.self_distances.min()}"]
+        lines.append("\tdistance histogram: " + ", ".join(
+            f"{d}: {count}" for d, count in enumerate(self.histogram) if count))
+        for a, b, d in self.violations:
+            lines.append(f"\t[ERROR] codes {a} (0x{int(self.codes[a]):x}) and "
+                         f"{b} (0x{int(self.codes[b]):x}) are {d} bits apart")
+        if self.num_violations > len(self.violations):
+            lines.append(f"\t... {self.num_violations - len(self.violations)} more violating pairs")
+        for k in np.flatnonzero(self.self_distances < self.min_hamming):
+            lines.append(f"\t[ERROR] code {k} (0x{int(self.codes[k]):x}) is "
+                         f"{self.self_distances[k]} bits from one of its rotations")
+        return "\n".join(lines)
+
+    @property
+    def ok(self) -> bool:
+        return self.num_violations == 0 and bool((self.self_distances >= self.min_hamming).all())
+
+
+if __name__ == "__main__":
+    all_families = list(apriltag_families) + list(deltag_families)
+    parser = argparse.ArgumentParser(
+        description="Check that tag families meet their minimum Hamming distance under rotations."
+    )
+    parser.add_argument(
+        "families",
+        nargs="*",
+        default=all_families,
+        help=f"Families to audit, among {', '.join(all_families)} (default: all)",
+    )
+    parser.add_argument(
+        "--min_hamming",
+        type=int,
+        default=None,
+        help="Required minimum distance (default: the one in the family name)",
+    )
+    parser.add_argument(
+        "--max_violations",
+        type=int,
+        default=20,
+        help="Maximum number of violating pairs listed per family (default: %(default)s)",
+    )
+    parsed = parser.parse_args()
+
+    for family in parsed.families:
+        if family not in all_families:
+            print(f"[ERROR] Unknown tag family \'{family}\'")
+            print(f"\tUse one of the following families instead.\n\t{all_families}")
+            sys.exit(0)
+
+    ok = True
+    for family in parsed.families:
+        start = time.perf_counter()
+        min_hamming = parsed.min_hamming or advertised_hamming(family)
+        audit = FamilyAudit(get_codes(family), get_num_bits(family), get_shape(family),
+                            min_hamming, parsed.max_violations)
+        print(audit.report(family))
+        print(f"\t{time.perf_counter() - start:.2f}s", flush=True)
+        ok &= audit.ok
+    sys.exit(0 if ok else 1)
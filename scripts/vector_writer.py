@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+
+import os
+import time
+import zlib
+import numpy as np
+import shapely
+
+PT_PER_MM = 72 / 25.4
+
+
+def board_fills(board):
+    """Return the (polygons, gray level) fills of a board in drawing order,
+    as draw_to_canvas draws them"""
+    fills = []
+    if board.bg_polygons is not None:
+        fills.append((board.bg_polygons, 0.0))
+    if board.fg_polygons is not None:
+        fills.append((board.fg_polygons, 1.0))
+    return fills
+
+
+def page_transform(fills, paper_width, paper_height, rotated=True):
+    """Return a function mapping board coordinates [mm] to page coordinates [pt]
+    that centers the content on the paper like pyx's document.page
+    (rotated=1, centered=1, fittosize=0) does. Rotated pages are written
+    upright with a /Rotate 90 entry, as pyx does.
+
+    Args:
+        fills (List[Tuple]): Fills of the page, see board_fills
+        paper_width (float): Paper width [pt]
+        paper_height (float): Paper height [pt]
+        rotated (bool): Rotate the content by 90 degrees
+    """
+    if not fills:
+        return lambda xy: xy * PT_PER_MM
+    xmin, ymin, xmax, ymax = shapely.total_bounds([polygons for polygons, _ in fills]) * PT_PER_MM
+    if rotated:
+        offset = np.array([0.5 * paper_width + 0.5 * (ymin + ymax),
+                           0.5 * paper_height - 0.5 * (xmin + xmax)])
+        return lambda xy: offset + PT_PER_MM * np.stack([-xy[:, 1], xy[:, 0]], axis=1)
+    else:
+        offset = np.array([0.5 * paper_width - 0.5 * (xmin + xmax),
+                           0.5 * paper_height - 0.5 * (ymin + ymax)])
+        return lambda xy: offset + PT_PER_MM * xy
+
+
+def path_rings(polygons, transform):
+    """Return all ring coordinates of polygons (without the repeated closing
+    point) after the transform, and the index where each ring starts"""
+    rings = shapely.get_rings(shapely.get_parts(polygons))
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    last = np.append(index[1:] != index[:-1], True)
+    keep = ~last
+    coords, index = coords[keep], index[keep]
+    starts = np.flatnonzero(np.append(True, index[1:] != index[:-1]))
+    return transform(coords), starts
+
+
+def format_path(coords, starts, svg=False):
+    # format rings as path operators in a single string formatting pass,
+    # postfix for pdf (x y m ... h) and prefix for svg (Mx y ... Z)
+    n = len(coords)
+    ends = np.append(starts[1:], n) - 1
+    pre = np.full(n, "", dtype=object)
+    post = np.full(n, "", dtype=object)
+    if svg:
+        pre[:] = "L"
+        pre[starts] = "M"
+        post[ends] = "Z"
+    else:
+        post[:] = " l\n"
+        post[starts] = " m\n"
+        post[ends] = post[ends] + "h\n"
+    items = np.empty((n, 4), dtype=object)
+    items[:, 0] = pre
+    items[:, 1] = coords[:, 0]
+    items[:, 2] = coords[:, 1]
+    items[:, 3] = post
+    return ("%s%.4f %.4f%s" * n) % tuple(items.ravel())
+
+
+class NativePDFWriter:
+    """Write board pages to a PDF file without pyx
+
+    Content streams are composed of m/l/h/f* operators straight from the
+    coordinate arrays of the polygons, and pages are written one at a time.
+
+    Args:
+        file (str): Output pdf filename
+        paper_width (float): Paper width [pt]
+        paper_height (float): Paper height [pt]
+        rotated (bool): Rotate the pages by 90 degrees
+        compress (bool): Compress content streams
+    """
+    def __init__(self, file: str, paper_width: float, paper_height: float,
+                 rotated: bool = True, compress: bool = True):
+        self.file = open(file, "wb")
+        self.paper_width = paper_width
+        self.paper_height = paper_height
+        self.rotated = rotated
+        self.compress = compress
+        self.fileposes = {}
+        self.kids = []
+
+        # The page tree is referenced by every page, reserve its number first
+        self.pages_refno = 1
+        self.refno = 2
+
+        self.file.write(b"%PDF-1.4\n%\xc3\xb6\xc3\xa9\n")
+
+    def write_object(self, refno, data: bytes):
+        self.fileposes[refno] = self.file.tell()
+        self.file.write(b"%i 0 obj\n" % refno + data + b"endobj\n")
+
+    def add_page(self, fills):
+        """Write a page with the given (polygons, gray level) fills"""
+        transform = page_transform(fills, self.paper_width, self.paper_height, self.rotated)
+        content = []
+        for polygons, gray in fills:
+            coords, starts = path_rings(polygons, transform)
+            if len(coords) == 0:
+                continue
+            content.append("%g g\n" % gray)
+            content.append(format_path(coords, starts))
+            content.append("f*\n")
+        content = "".join(content).encode("ascii")
+
+        page_refno, content_refno = self.refno, self.refno + 1
+        self.refno += 2
+        self.write_object(page_refno, (
+            "<<\n"
+            "/Type /Page\n"
+            "/Parent %i 0 R\n"
+            "/MediaBox [0 0 %f %f]\n"
+            "%s"
+            "/Contents %i 0 R\n"
+            "/Resources << /ProcSet [ /PDF ] >>\n"
+            ">>\n" % (self.pages_refno, self.paper_width, self.paper_height,
+                      "/Rotate 90\n" if self.rotated else "", content_refno)).encode("ascii"))
+        if self.compress:
+            content = zlib.compress(content)
+        self.write_object(content_refno, (
+            "<<\n"
+            "/Length %i\n"
+            "%s"
+            ">>\n"
+            "stream\n" % (len(content), "/Filter /FlateDecode\n" if self.compress else "")
+        ).encode("ascii") + content + b"endstream\n")
+        self.kids.append(page_refno)
+
+    def close(self):
+        """Write the page tree, catalog, info and cross-reference table"""
+        self.write_object(self.pages_refno, (
+            "<<\n"
+            "/Type /Pages\n"
+            "/Kids [%s]\n"
+            "/Count %i\n"
+            ">>\n" % (" ".join(["%i 0 R" % refno for refno in self.kids]), len(self.kids))
+        ).encode("ascii"))
+        catalog_refno, info_refno = self.refno, self.refno + 1
+        self.refno += 2
+        self.write_object(catalog_refno, (
+            "<<\n"
+            "/Type /Catalog\n"
+            "/Pages %i 0 R\n"
+            ">>\n" % self.pages_refno).encode("ascii"))
+        self.write_object(info_refno, (
+            "<<\n"
+            "/Producer (deltille generate_pattern.py)\n"
+            "/CreationDate (D:%s)\n"
+            ">>\n" % time.strftime("%Y%m%d%H%M%SZ", time.gmtime(
+                int(os.environ.get("SOURCE_DATE_EPOCH", time.time()))))
+        ).encode("ascii"))
+
+        xrefpos = self.file.tell()
+        xref = ["xref\n0 %d\n0000000000 65535 f \n" % self.refno]
+        xref += ["%010i 00000 n \n" % self.fileposes[refno] for refno in range(1, self.refno)]
+        xref.append("trailer\n"
+                    "<<\n"
+                    "/Size %i\n"
+                    "/Root %i 0 R\n"
+                    "/Info %i 0 R\n"
+                    ">>\n"
+                    "startxref\n"
+                    "%i\n"
+                    "%%%%EOF\n" % (self.refno, catalog_refno, info_refno, xrefpos))
+        self.file.write("".join(xref).encode("ascii"))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_svg(file: str, fills, paper_width: float, paper_height: float, rotated: bool = True):
+    """Write one board page to an SVG file, laid out as the PDF page is
+    displayed (i.e. landscape for rotated pages)
+
+    Args:
+        file (str): Output svg filename
+        fills (List[Tuple]): Fills of the page, see board_fills
+        paper_width (float): Paper width [pt]
+        paper_height (float): Paper height [pt]
+        rotated (bool): Rotate the page by 90 degrees
+    """
+    transform = page_transform(fills, paper_width, paper_height, rotated)
+    if rotated:
+        # a PDF page rotated by 90 degrees shows (x, y) at (y, x) from the top-left
+        width, height = paper_height, paper_width
+        to_svg = lambda xy: transform(xy)[:, ::-1]
+    else:
+        width, height = paper_width, paper_height
+        to_svg = lambda xy: np.stack([transform(xy)[:, 0], paper_height - transform(xy)[:, 1]], axis=1)
+
+    with open(file, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+                'width="%fpt" height="%fpt" viewBox="0 0 %f %f">\n' % (width, height, width, height))
+        for polygons, gray in fills:
+            coords, starts = path_rings(polygons, to_svg)
+            if len(coords) == 0:
+                continue
+            level = round(255 * gray)
+            f.write('<path fill="#%02x%02x%02x" fill-rule="evenodd" d="' % (level, level, level))
+            f.write(format_path(coords, starts, svg=True))
+            f.write('"/>\n')
+        f.write('</svg>\n')
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import subprocess
+import sys
+import numpy as np
+
+from orpc_io import load_consolidated_orpc
+
+
+def detect_video(detector: str, target: str, video: str, consolidated: str, stride: int = 1,
+                 start: float = 0.0, end: float = -1.0, threads: int = 0) -> int:
+    """Run the detector over the frames of a video, decoded in the detector
+    without writing any image, and write all their corners to consolidated
+
+    Returns:
+        exit code of the detector
+    """
+    command = [detector, "-t", target, "-v", video, "-c", consolidated,
+               "--stride", str(stride), "--start", str(start), "--end", str(end),
+               "--threads", str(threads)]
+    return subprocess.run(command, stdout=subprocess.DEVNULL).returncode
+
+
+def frame_indices(image_files) -> np.ndarray:
+    """Video frame index of every frame, from its name <video>_<index>.jpg"""
+    return np.array([int(os.path.splitext(f)[0].rsplit("_", 1)[1]) for f in image_files],
+                    dtype=np.int64)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Detect the corners of the frames of a video into one table (npz)."
+    )
+    parser.add_argument("target", help="Target dsc file")
+    parser.add_argument("video", help="Video file, any format cv::VideoCapture reads")
+    parser.add_argument(
+        "output",
+        nargs="?",
+        default="",
+        help="Output npz table (see orpc_io.py) (default: the video name with .npz)",
+    )
+    parser.add_argument(
+        "--detector",
+        default=os.path.join("build", "apps", "deltille_detector"),
+        help="Detector executable (default: %(default)s)",
+    )
+    parser.add_argument("--stride", type=int, default=1, help="Detect every stride-th frame (default: %(default)s)")
+    parser.add_argument("--start", type=float, default=0.0, help="First time to detect [s] (default: %(default)s)")
+    parser.add_argument(
+        "--end",
+        type=float,
+        default=-1.0,
+        help="Last time to detect [s]; negative detects until the end (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of detection threads; 0 uses all cores (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--keep_orpc",
+        default="",
+        help="Keep the consolidated orpc file of the detector here, binary if it ends with .orpcb (default: removed)",
+    )
+    parsed = parser.parse_args()
+
+    if not os.path.isfile(parsed.detector):
+        print(f"[ERROR] Detector \'{parsed.detector}\' not found")
+        print("\tBuild it first (see How to compile), or set --detector.")
+        sys.exit(0)
+
+    base = os.path.splitext(parsed.video)[0]
+    output = parsed.output or base + ".npz"
+    consolidated = parsed.keep_orpc or base + f".{os.getpid()}.orpcb"
+    returncode = detect_video(parsed.detector, parsed.target, parsed.video, consolidated,
+                              parsed.stride, parsed.start, parsed.end, parsed.threads)
+    if returncode != 0:
+        print(f"[ERROR] The detector exited with code {returncode}")
+        sys.exit(1)
+
+    table = load_consolidated_orpc(consolidated)
+    if not parsed.keep_orpc:
+        os.remove(consolidated)
+    table.files = [parsed.video] * len(table)
+    table.save(output)
+    frames = frame_indices(table.image_files)
+    print(f"{len(table)} frames ({frames[0] if len(frames) else '-'} to {frames[-1] if len(frames) else '-'}), "
+          f"{table.offsets[-1]} corners in {output}")